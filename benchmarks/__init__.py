@@ -0,0 +1,7 @@
+"""
+Benchmarks for the scan pipeline, run offline against a local stub of the Open Food Facts API
+
+    python -m benchmarks.run                  # all stages, results saved per commit
+    python -m benchmarks.run --compare        # ... and compared with the last other commit
+    python -m benchmarks.corpus record barcodes.txt   # record live API responses as fixtures
+"""
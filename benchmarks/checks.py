@@ -0,0 +1,278 @@
+"""
+Equivalence checks for the optimized code paths
+
+    python -m benchmarks.checks [--products 2000] [--seed 1]
+
+Each fast path is compared with a straightforward reference on the benchmark corpus (see
+benchmarks.corpus) plus generated edge cases, and the command exits with status 1 if any
+result differs. Run it alongside benchmarks.run when changing one of them:
+
+* vectorized scorer (score_frame) and columnar store vs calculate_health_score and
+  score_product, including nutrient values exactly on (and one step off) band breakpoints,
+  kJ energy values and missing or NaN nutrients
+* KeywordMatcher.classify / find vs a substring test per keyword
+* normalize_gtin vs a direct GS1 check digit computation
+* parse_ingredients on hand-checked ingredient texts (decimal commas, nested brackets)
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import tempfile
+
+from nutriscan.columnar import COLUMNS, ColumnarStore, write_columnar
+from nutriscan.gtin import InvalidBarcode, normalize_gtin
+from nutriscan.ingredients import Ingredient, parse_ingredients
+from nutriscan.keywords import KeywordMatcher
+from nutriscan.openfoodfacts import normalize_product
+from nutriscan.records import NUTRIENT_KEYS, Product
+from nutriscan.rules import ADDITIVES_COUNT, DEFAULT_PROFILE, SCORING_PROFILE
+from nutriscan.scoring import calculate_health_score, score_product
+from nutriscan.vectorized import product_frame, score_frame
+
+from benchmarks.corpus import DEFAULT_CORPUS_PATH, get_corpus
+
+# Mismatches printed per check; the count is always reported
+MAX_REPORTED = 5
+
+
+class Check:
+    """Counts cases and collects the first mismatches of one check"""
+
+    def __init__(self, name):
+        self.name = name
+        self.cases = 0
+        self.mismatches = []
+
+    def compare(self, case, expected, actual):
+        self.cases += 1
+        if expected != actual:
+            self.mismatches.append((case, expected, actual))
+
+    def report(self):
+        print(f"  {self.name:<28} {self.cases:>8} cases  {len(self.mismatches)} mismatches")
+        for case, expected, actual in self.mismatches[:MAX_REPORTED]:
+            print(f"    {case!r}\n      expected {expected!r}\n      got      {actual!r}")
+        return not self.mismatches
+
+
+# -------------------------------
+# Health Score
+# -------------------------------
+def _edge_values(rule, exact):
+    """Values around a rule's breakpoints; with exact=False also one float step either side"""
+    values = [0.0, -1.0, math.nan]
+    for breakpoint in rule.breakpoints:
+        targets = [breakpoint]
+        if rule.kj_to_kcal_above is not None:
+            # The same band edge given in kJ (scored as value / 4.184), and the kJ cut-off itself
+            targets += [breakpoint * 4.184, rule.kj_to_kcal_above]
+        for value in targets:
+            values.append(float(value))
+            if not exact:
+                values += [math.nextafter(value, -math.inf), math.nextafter(value, math.inf)]
+    return values
+
+
+def edge_products(rng, count, exact, profile=None):
+    """
+    Product infos whose nutrients sit on band edges or are missing (absent key or NaN)
+    exact=True keeps to values a float32 column stores exactly (see nutriscan.columnar)
+    """
+    profile = profile or SCORING_PROFILE
+    edges = {rule.nutrient: _edge_values(rule, exact) for rule in profile.rules}
+    keywords = list(profile.quality.positive + profile.quality.negative)
+    products = []
+    for _ in range(count):
+        nutriments = {}
+        for key in NUTRIENT_KEYS:
+            if rng.random() < 0.15:
+                continue  # Missing nutrient
+            nutriments[key] = rng.choice(edges[key]) if key in edges else round(rng.uniform(0, 50), 1)
+        additives = rng.choice(edges[ADDITIVES_COUNT])
+        additives = int(additives) if additives > 0 else 0
+        products.append({
+            'success': True,
+            'nutriments': nutriments,
+            'additives': [f"en:e{100 + i}" for i in range(additives)],
+            'ingredients': ', '.join(rng.sample(keywords, rng.randint(0, len(keywords)))),
+        })
+    return products
+
+
+def check_scores(products, exact_products):
+    """Vectorized and columnar scores vs the scalar scorers"""
+    scalar = [calculate_health_score(product_info) for product_info in products]
+
+    records = Check("score_product (records)")
+    for product_info, (score, explanations, components) in zip(products, scalar):
+        result = score_product(Product.from_product_info(product_info))
+        records.compare(product_info, (score, explanations, tuple(components.values())),
+                        (result.score, result.explanations, result.components))
+
+    vectorized = Check("score_frame")
+    scores = score_frame(product_frame(products))
+    for i, (product_info, (score, explanations, components)) in enumerate(zip(products, scalar)):
+        vectorized.compare(product_info, (score, explanations, tuple(components.values())),
+                           (int(scores.scores[i]), scores.explain(i), tuple(scores.components[i])))
+
+    columnar = Check("ColumnarStore.score")
+    profile = SCORING_PROFILE
+    rows = []
+    for i, product_info in enumerate(exact_products):
+        nutriments = product_info['nutriments']
+        values = [nutriments.get(key, math.nan) for key in NUTRIENT_KEYS]
+        values += [len(product_info['additives']), profile.quality_count(product_info['ingredients'].lower())]
+        rows.append((f"{i:014d}", values))
+    assert len(rows[0][1]) == len(COLUMNS)
+    fd, path = tempfile.mkstemp(suffix=".columns")
+    os.close(fd)
+    try:
+        write_columnar(path, rows, profile.version)
+        store = ColumnarStore(path)
+        scores = store.score(profile)
+        for (barcode, _), product_info in zip(rows, exact_products):
+            score, explanations, components = calculate_health_score(product_info)
+            row = store.row(barcode)
+            columnar.compare(product_info, (score, explanations, tuple(components.values())),
+                             (int(scores.scores[row]), scores.explain(row), tuple(scores.components[row])))
+        store.close()
+    finally:
+        os.remove(path)
+    return [records, vectorized, columnar]
+
+
+# -------------------------------
+# Keyword Matching
+# -------------------------------
+# Overlapping keywords: contained in each other, sharing prefixes/suffixes, straddling
+_TRICKY_GROUPS = {
+    'a': ['syrup', 'corn syrup', 'rup', 'ups', 'aa', 'aaa'],
+    'b': ['orn', 'corn', 'upsa', 'a', 'rn sy'],
+    'c': ['sa', 'aab', 'b'],
+}
+
+
+def _brute_mask(matcher, groups, text):
+    text = text.lower()
+    mask = 0
+    for name, keywords in groups.items():
+        if any(keyword.lower() in text for keyword in keywords):
+            mask |= matcher.bits[name]
+    return mask
+
+
+def check_keywords(rng, texts):
+    """KeywordMatcher vs a substring test per keyword, on ingredient texts and random strings"""
+    display = DEFAULT_PROFILE['ingredient_display']
+    classify = Check("KeywordMatcher.classify")
+    find = Check("KeywordMatcher.find")
+    for groups in ({'positive': display['positive'], 'negative': display['negative']}, _TRICKY_GROUPS):
+        matcher = KeywordMatcher(groups)
+        keywords = sorted(matcher.keyword_bits)
+        fragments = keywords + [keyword[:len(keyword) // 2] for keyword in keywords] + [' ', ', ', 'X', '\n']
+        samples = list(texts)
+        for _ in range(2000):
+            samples.append([''.join(rng.choice(fragments) for _ in range(rng.randint(0, 6)))
+                            for _ in range(rng.randint(1, 8))])
+        for sample in samples:
+            classify.compare(sample, [_brute_mask(matcher, groups, text) for text in sample],
+                             matcher.classify(sample))
+            for text in sample:
+                lowered = text.lower()
+                find.compare(text, {keyword for keyword in keywords if keyword in lowered}, matcher.find(lowered))
+    return [classify, find]
+
+
+# -------------------------------
+# GTIN Check Digits
+# -------------------------------
+# Published example codes: EAN-8, EAN-13 and UPC-A
+KNOWN_GTINS = ['96385074', '4006381333931', '3017620422003', '737628064502', '036000291452']
+
+
+def _gs1_valid(code):
+    """Direct GS1 rule: padded to 18 digits, weights 3, 1, 3, ... from the left, sum divisible by 10"""
+    padded = code.rjust(18, '0')
+    return sum(int(d) * (3 if i % 2 == 0 else 1) for i, d in enumerate(padded)) % 10 == 0
+
+
+def check_gtins(rng):
+    """normalize_gtin accepts exactly the codes with a valid check digit, as their GTIN-14"""
+    gtins = Check("normalize_gtin")
+    codes = list(KNOWN_GTINS)
+    for _ in range(20000):
+        codes.append(''.join(rng.choice('0123456789') for _ in range(rng.choice((8, 12, 13, 14)))))
+    for code in KNOWN_GTINS:  # Every single-digit typo of a valid code
+        for i in range(len(code)):
+            codes += [code[:i] + d + code[i + 1:] for d in '0123456789' if d != code[i]]
+    for code in codes:
+        expected = code.rjust(14, '0') if _gs1_valid(code) else None
+        try:
+            actual = normalize_gtin(code)
+        except InvalidBarcode:
+            actual = None
+        gtins.compare(code, expected, actual)
+    for code in KNOWN_GTINS:
+        gtins.compare(code, True, _gs1_valid(code))
+    return [gtins]
+
+
+# -------------------------------
+# Ingredients Parsing
+# -------------------------------
+def _ingredient(name, percent=None, *subs):
+    return Ingredient(name, percent, subs)
+
+
+INGREDIENT_CASES = [
+    # A comma inside a number is a decimal comma, not a separator
+    ('sugar 12,5%, salt', [_ingredient('sugar', 12.5), _ingredient('salt')]),
+    ('water, stabilisers [e412, e415 (0,5 %)]',
+     [_ingredient('water'), _ingredient('stabilisers', None, _ingredient('e412'), _ingredient('e415', 0.5))]),
+    ('milk chocolate 45% (sugar, cocoa butter 20%, milk), salt',
+     [_ingredient('milk chocolate', 45.0, _ingredient('sugar'), _ingredient('cocoa butter', 20.0),
+                  _ingredient('milk')),
+      _ingredient('salt')]),
+    ('sugar (12%)', [_ingredient('sugar', 12.0)]),
+    # Quantities are dropped from names; digits glued to letters are kept
+    ('wheat flour 2.5 g; e330, vitamin b12', [_ingredient('wheat flour'), _ingredient('e330'),
+                                             _ingredient('vitamin b12')]),
+    ('salt), pepper (black', [_ingredient('salt'), _ingredient('pepper', None, _ingredient('black'))]),
+]
+
+
+def check_ingredients():
+    parsed = Check("parse_ingredients")
+    for text, expected in INGREDIENT_CASES:
+        parsed.compare(text, expected, parse_ingredients(text))
+    return [parsed]
+
+
+# -------------------------------
+# Command Line Interface
+# -------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the optimized code paths against their references")
+    parser.add_argument('--products', type=int, default=2000, help="corpus products to use (default: 2000)")
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS_PATH, help="recorded corpus (synthetic if missing)")
+    parser.add_argument('--seed', type=int, default=1, help="seed for the generated cases (default: 1)")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    responses, corpus = get_corpus(args.corpus, args.products)
+    corpus_products = [normalize_product(r['product'], normalize_gtin(r['code'])) for r in responses]
+    exact_products = corpus_products + edge_products(rng, 5000, exact=True)
+    products = exact_products + edge_products(rng, 5000, exact=False)
+    ingredient_lists = [product_info['ingredients'].split(', ') for product_info in corpus_products]
+
+    print(f"Corpus {corpus} ({len(responses)} products), seed {args.seed}")
+    checks = check_scores(products, exact_products) + check_keywords(rng, ingredient_lists) + check_gtins(rng) + \
+        check_ingredients()
+    passed = [check.report() for check in checks]
+    return 0 if all(passed) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""
+Benchmark corpus: Open Food Facts API responses, one JSON document per line (gzipped)
+
+Recorded responses (python -m benchmarks.corpus record barcodes.txt) are used when present;
+otherwise a deterministic synthetic corpus with the same document shape is generated. No
+recorded corpus is committed, so unless one is recorded locally every benchmark and check
+runs on synthetic products only.
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+
+DEFAULT_CORPUS_PATH = os.path.join(os.path.dirname(__file__), "fixtures", "corpus.jsonl.gz")
+
+# -------------------------------
+# Corpus Files
+# -------------------------------
+def load_corpus(path):
+    """Return the list of API responses stored in a corpus file"""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def save_corpus(responses, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        for response in responses:
+            f.write(json.dumps(response) + '\n')
+
+
+def record_corpus(barcodes, path, client=None):
+    """Fetch barcodes from the live API and save the responses as a corpus"""
+    from nutriscan.client import OpenFoodFactsClient
+
+    client = client or OpenFoodFactsClient()
+    responses = []
+    for barcode in barcodes:
+        response = client.get_product(barcode)
+        if response.data and response.data.get('status') == 1:
+            responses.append(response.data)
+        else:
+            print(f"{barcode}: not found, skipped", file=sys.stderr)
+    save_corpus(responses, path)
+    return responses
+
+
+# -------------------------------
+# Synthetic Corpus
+# -------------------------------
+_CATEGORIES = ["Breakfast cereals", "Snacks, Sweet snacks, Biscuits", "Beverages, Sodas",
+               "Dairies, Yogurts", "Plant-based foods, Noodles", "Meals, Pizzas"]
+_BRANDS = ["Acme", "Nestle", "Kelloggs", "Danone", "Simply Asia", "Barilla"]
+_INGREDIENTS = ["rice", "whole grain oats", "sugar", "organic fruit", "artificial flavor", "salt",
+                "palm oil", "corn syrup", "vitamin B12", "natural flavor", "water", "hydrogenated oil",
+                "wheat flour", "milk powder", "cocoa", "modified starch", "E330", "soy lecithin"]
+
+
+def _ean13(i):
+    base = f"{i:012d}"
+    total = sum(int(d) * (3 if k % 2 else 1) for k, d in enumerate(base))
+    return base + str((10 - total % 10) % 10)
+
+
+def _ingredients_text(rng):
+    # Top-level ingredients, some with percentages and bracketed sub-ingredients
+    parts = []
+    for name in rng.sample(_INGREDIENTS, rng.randint(3, 12)):
+        if rng.random() < 0.2:
+            name += f" {rng.randint(1, 60)}%"
+        if rng.random() < 0.15:
+            name += f" ({', '.join(rng.sample(_INGREDIENTS, rng.randint(2, 4)))})"
+        parts.append(name)
+    return ", ".join(parts)
+
+
+def synthetic_corpus(n, seed=1):
+    """n API responses for found products, shaped like projected API documents"""
+    rng = random.Random(seed)
+    responses = []
+    for i in range(n):
+        nutriments = {}
+        for key, high in [('energy', 2500), ('sugars', 40), ('fat', 35), ('saturated-fat', 15),
+                          ('salt', 4), ('fiber', 10), ('proteins', 25), ('carbohydrates', 80)]:
+            if rng.random() < 0.9:
+                value = round(rng.uniform(0, high), 2)
+                nutriments[f'{key}_100g'] = value
+                nutriments[f'{key}_value'] = value
+                nutriments[f'{key}_unit'] = 'kJ' if key == 'energy' else 'g'
+                nutriments[f'{key}_serving'] = round(value / 3, 2)
+        ingredients_text = _ingredients_text(rng)
+        product = {
+            'code': _ean13(300000000000 + i * 7),
+            'rev': rng.randint(1, 40),
+            'product_name': f"Product {i} {rng.choice(['crunchy', 'classic', 'light', 'choco'])}",
+            'brands': rng.choice(_BRANDS),
+            'categories': rng.choice(_CATEGORIES),
+            'ingredients_text': ingredients_text,
+            'ingredients': [],
+            'image_url': '',
+            'nutrition_grade_fr': rng.choice('abcde'),
+            'nutriments': nutriments,
+            'additives_tags': [f"en:e{rng.randint(100, 999)}" for _ in range(rng.randint(0, 7))],
+            'ingredients_analysis_tags': ['en:palm-oil-free', 'en:vegan-status-unknown'],
+        }
+        if rng.random() < 0.3:  # Some products come with structured ingredients
+            product['ingredients'] = [
+                {'id': f"en:{text.split(' (')[0].replace(' ', '-')}", 'text': text.split(' (')[0], 'rank': rank}
+                for rank, text in enumerate(ingredients_text.split(', '), 1)
+            ]
+        responses.append({'code': product['code'], 'status': 1, 'product': product})
+    return responses
+
+
+def get_corpus(path=DEFAULT_CORPUS_PATH, size=500):
+    """Recorded corpus if one exists, else a synthetic one; returns (responses, description)"""
+    if path and os.path.exists(path):
+        return load_corpus(path)[:size], os.path.basename(path)
+    return synthetic_corpus(size), "synthetic"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the benchmark corpus")
+    sub = parser.add_subparsers(dest='command', required=True)
+    record = sub.add_parser('record', help="record live API responses for a file of barcodes")
+    record.add_argument('barcodes', help="file with one barcode per line")
+    record.add_argument('-o', '--output', default=DEFAULT_CORPUS_PATH, help=f"default: {DEFAULT_CORPUS_PATH}")
+    synth = sub.add_parser('synthetic', help="write a synthetic corpus")
+    synth.add_argument('-n', type=int, default=500)
+    synth.add_argument('-o', '--output', default=DEFAULT_CORPUS_PATH, help=f"default: {DEFAULT_CORPUS_PATH}")
+    args = parser.parse_args(argv)
+
+    if args.command == 'record':
+        from nutriscan.batch import read_barcodes
+        responses = record_corpus(read_barcodes(args.barcodes), args.output)
+    else:
+        responses = synthetic_corpus(args.n)
+        save_corpus(responses, args.output)
+    print(f"Wrote {len(responses)} responses to {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
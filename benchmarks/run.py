@@ -0,0 +1,408 @@
+"""
+Scan pipeline benchmarks
+
+    python -m benchmarks.run [--products 500] [--stages fetch,score,...] [--compare [COMMIT]]
+
+Every stage runs against a local stub of the Open Food Facts API serving the benchmark
+corpus (see benchmarks.corpus), so no network access is needed. Each stage is run twice:
+once timed, once under tracemalloc for its peak Python memory. Results are appended to
+.benchmarks/results.jsonl with the current commit; --compare reports the change against the
+latest run of another commit and exits with status 1 if a stage got slower than --threshold.
+"""
+import argparse
+import gzip
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import threading
+import tracemalloc
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# Product cache, scan history and barcode filter default paths are read when nutriscan is imported;
+# point them at a scratch directory so benchmark runs never touch the user's files
+WORKDIR = tempfile.mkdtemp(prefix="nutriscan-bench-")
+os.environ["NUTRISCAN_CACHE_PATH"] = os.path.join(WORKDIR, "products.sqlite3")
+os.environ["NUTRISCAN_HISTORY_PATH"] = os.path.join(WORKDIR, "history.sqlite3")
+os.environ["NUTRISCAN_BLOOM_PATH"] = os.path.join(WORKDIR, "known_barcodes.bloom")
+
+import nutriscan.client  # noqa: E402
+from nutriscan import metrics  # noqa: E402
+from nutriscan.batch import score_barcodes  # noqa: E402
+from nutriscan.cache import ProductCache  # noqa: E402
+from nutriscan.client import OpenFoodFactsClient  # noqa: E402
+from nutriscan.columnar import ColumnarStore, iter_store_columns, write_columnar  # noqa: E402
+from nutriscan.dump import ingest_dump  # noqa: E402
+from nutriscan.fetcher import ProductFetcher  # noqa: E402
+from nutriscan.gtin import normalize_gtin  # noqa: E402
+from nutriscan.ingredients import extract_ingredients_list  # noqa: E402
+from nutriscan.openfoodfacts import get_product_info_openfoodfacts, normalize_product  # noqa: E402
+from nutriscan.rules import SCORING_PROFILE  # noqa: E402
+from nutriscan.scoring import calculate_health_score  # noqa: E402
+from nutriscan.store import ProductStore  # noqa: E402
+
+from benchmarks.corpus import DEFAULT_CORPUS_PATH, get_corpus  # noqa: E402
+from benchmarks.stub_server import StubServer  # noqa: E402
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_PATH = os.path.join(REPO_ROOT, ".benchmarks", "results.jsonl")
+APP_PATH = os.path.join(REPO_ROOT, "main.py")
+RENDER_SCANS = 20  # UI scans are slow; render stages use the first barcodes only
+# fetch_coalesced: bursts of simultaneous lookups of one barcode, as from that many sessions.
+# The stub answers no faster than COALESCE_LATENCY so every burst overlaps one upstream call
+COALESCE_SESSIONS = 32
+COALESCE_BURSTS = 20
+COALESCE_LATENCY = 0.05
+
+# Runs in a fresh interpreter. streamlit is imported before the clock starts, as the server
+# does before running the app, so the app script's own imports and first render are timed
+COLD_START_SCRIPT = """
+import sys, time
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file(sys.argv[1], default_timeout=60)
+started = time.perf_counter()
+app.run()
+print(time.perf_counter() - started)
+"""
+
+# latencies_ms is None for stages timed as a whole (batch scoring, dump ingest)
+StageResult = namedtuple('StageResult', ['ops', 'seconds', 'latencies_ms'])
+
+
+# -------------------------------
+# Stages
+# -------------------------------
+def scratch_path(suffix):
+    """New empty file in the scratch directory (SQLite treats an empty file as a new database)"""
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=WORKDIR)
+    os.close(fd)
+    return path
+
+
+class Stages:
+    """Each stage method does its own setup and returns a StageResult for the timed part"""
+
+    def __init__(self, responses, server, workers, repeat):
+        self.responses = responses
+        self.server = server
+        self.barcodes = [response['code'] for response in responses]
+        # Keyed on the GTIN-14, as lookups are, so fetch_cached is served from the warm cache
+        self.product_infos = [normalize_product(r['product'], normalize_gtin(r['code'])) for r in responses]
+        self.client = OpenFoodFactsClient(base_url=server.url, pool_size=max(workers, 4))
+        self.workers = workers
+        self.repeat = repeat
+
+    @staticmethod
+    def _timed(fn, items, repeat=1):
+        """Time fn on every item; with repeat > 1 the fastest of that many passes is kept"""
+        best = None
+        for _ in range(repeat):
+            latencies = []
+            started = time.perf_counter()
+            for item in items:
+                t = time.perf_counter()
+                fn(item)
+                latencies.append((time.perf_counter() - t) * 1000)
+            result = StageResult(len(latencies), time.perf_counter() - started, latencies)
+            if best is None or result.seconds < best.seconds:
+                best = result
+        return best
+
+    def fetch(self):
+        """Uncached lookup: HTTP round trip to the stub, JSON decode, normalization"""
+        return self._timed(lambda barcode: get_product_info_openfoodfacts(barcode, client=self.client), self.barcodes)
+
+    def fetch_cached(self):
+        """Lookup answered from a warm on-disk product cache"""
+        cache = ProductCache(scratch_path(".sqlite3"))
+        for info in self.product_infos:
+            cache.put(info['barcode'], info)
+        return self._timed(
+            lambda barcode: get_product_info_openfoodfacts(barcode, cache=cache, client=self.client),
+            self.barcodes, self.repeat
+        )
+
+    def fetch_coalesced(self):
+        """
+        Uncached lookups of one barcode by COALESCE_SESSIONS threads at once through the app's
+        ProductFetcher; fails unless each burst makes exactly one upstream call
+        """
+        fetcher = ProductFetcher(client=self.client)
+        sessions = ThreadPoolExecutor(max_workers=COALESCE_SESSIONS)
+        latency = self.server.latency
+        self.server.latency = max(latency, COALESCE_LATENCY)
+
+        def session(barcode, start):
+            start.wait()
+            return fetcher.fetch(barcode).result()
+
+        def burst(barcode):
+            requests, coalesced = self.server.requests, metrics.FETCH_COALESCED.total()
+            start = threading.Barrier(COALESCE_SESSIONS)
+            results = list(sessions.map(session, [barcode] * COALESCE_SESSIONS, [start] * COALESCE_SESSIONS))
+            upstream = self.server.requests - requests
+            joined = metrics.FETCH_COALESCED.total() - coalesced
+            if upstream != 1 or joined != COALESCE_SESSIONS - 1:
+                raise AssertionError(f"{barcode}: {COALESCE_SESSIONS} simultaneous lookups made {upstream} upstream "
+                                     f"calls ({joined} coalesced), expected 1 ({COALESCE_SESSIONS - 1} coalesced)")
+            if not all(result is results[0] and result.get('success') for result in results):
+                raise AssertionError(f"{barcode}: coalesced lookups returned different results")
+
+        try:
+            return self._timed(burst, self.barcodes[:COALESCE_BURSTS])
+        finally:
+            self.server.latency = latency
+            sessions.shutdown()
+
+    def ingredients(self):
+        return self._timed(extract_ingredients_list, self.product_infos, self.repeat)
+
+    def score(self):
+        return self._timed(calculate_health_score, self.product_infos, self.repeat)
+
+    def batch(self):
+        """nutriscan.batch over the whole corpus, without the product cache"""
+        started = time.perf_counter()
+        count = sum(1 for _ in score_barcodes(self.barcodes, workers=self.workers, client=self.client))
+        return StageResult(count, time.perf_counter() - started, None)
+
+    def _dump_path(self):
+        path = os.path.join(WORKDIR, "dump.jsonl.gz")
+        if not os.path.exists(path):
+            with gzip.open(path, 'wt', encoding='utf-8') as f:
+                for response in self.responses:
+                    f.write(json.dumps(response['product']) + '\n')
+        return path
+
+    def dump(self):
+        """nutriscan.dump ingest of the corpus products into a fresh product store"""
+        path = self._dump_path()
+        store = ProductStore(scratch_path(".sqlite3"))
+        started = time.perf_counter()
+        stored, _ = ingest_dump(path, store, workers=self.workers)
+        seconds = time.perf_counter() - started
+        store.close()
+        return StageResult(stored, seconds, None)
+
+    def score_columnar(self):
+        """Open the memory-mapped columnar store and score every product in it"""
+        path = os.path.join(WORKDIR, "catalog.columns")
+        if not os.path.exists(path):
+            store = ProductStore(scratch_path(".sqlite3"))
+            ingest_dump(self._dump_path(), store, workers=self.workers)
+            write_columnar(path, iter_store_columns(store), SCORING_PROFILE.version)
+            store.close()
+        best = None
+        for _ in range(self.repeat):
+            started = time.perf_counter()
+            count = len(ColumnarStore(path).score())
+            seconds = time.perf_counter() - started
+            best = seconds if best is None else min(best, seconds)
+        return StageResult(count, best, None)
+
+    def _app(self):
+        from streamlit.testing.v1 import AppTest
+
+        # The app's fetcher uses the default client; point it at the stub
+        nutriscan.client._default_client = self.client
+        app = AppTest.from_file(APP_PATH, default_timeout=60)
+        app.run()
+        return app
+
+    def startup(self):
+        """First app run in a new server process: module imports, page setup, empty tabs"""
+        from streamlit.testing.v1 import AppTest  # noqa: F401 (skip the stage without streamlit)
+
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_ROOT, os.environ.get('PYTHONPATH')])))
+        latencies = []
+        for _ in range(self.repeat):
+            output = subprocess.run([sys.executable, '-c', COLD_START_SCRIPT, APP_PATH], cwd=REPO_ROOT, env=env,
+                                    capture_output=True, text=True, check=True).stdout
+            latencies.append(float(output.split()[-1]) * 1000)
+        return StageResult(len(latencies), sum(latencies) / 1000, latencies)
+
+    def startup_rerun(self):
+        """App rerun before any scan, e.g. the first widget interaction of a new session"""
+        app = self._app()
+        return self._timed(lambda _: app.run(), range(RENDER_SCANS))
+
+    def render_scan(self):
+        """Full app rerun after clicking Scan (lookup, analysis, all tabs rendered)"""
+        app = self._app()
+
+        def scan(barcode):
+            app.text_input[0].input(barcode)
+            app.button[0].click()
+            app.run()
+        return self._timed(scan, self.barcodes[:RENDER_SCANS])
+
+    def render_rerun(self):
+        """App rerun with a product already scanned, e.g. after a tab switch or widget change"""
+        app = self._app()
+        app.text_input[0].input(self.barcodes[0])
+        app.button[0].click()
+        app.run()
+        return self._timed(lambda _: app.run(), range(RENDER_SCANS))
+
+
+STAGE_NAMES = ['fetch', 'fetch_cached', 'fetch_coalesced', 'ingredients', 'score', 'score_columnar', 'batch', 'dump',
+               'startup', 'startup_rerun', 'render_scan', 'render_rerun']
+
+
+def run_stage(stages, name):
+    """Time a stage, then rerun it under tracemalloc; returns its metrics dict"""
+    result = getattr(stages, name)()
+    tracemalloc.start()
+    getattr(stages, name)()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    metrics = {
+        'ops': result.ops,
+        'seconds': round(result.seconds, 4),
+        'ops_per_s': round(result.ops / result.seconds, 1) if result.seconds else None,
+        'peak_kb': round(peak / 1024, 1),
+    }
+    if result.latencies_ms:
+        latencies = sorted(result.latencies_ms)
+        metrics['p50_ms'] = round(latencies[len(latencies) // 2], 4)
+        metrics['p95_ms'] = round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 4)
+    return metrics
+
+
+# -------------------------------
+# Results Across Commits
+# -------------------------------
+def current_commit():
+    """(short commit hash, working tree has changes), or ('unknown', False) outside git"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        status = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_ROOT,
+                                capture_output=True, text=True, check=True).stdout
+        return commit, bool(status.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown', False
+
+
+def load_results(path=RESULTS_PATH):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def save_result(result, path=RESULTS_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(result) + '\n')
+
+
+def find_baseline(results, commit, ref=None):
+    """Latest saved run of ref (a commit prefix), or of any commit other than the current one"""
+    for result in reversed(results):
+        if ref is not None and result['commit'].startswith(ref):
+            return result
+        if ref is None and result['commit'] != commit:
+            return result
+    return None
+
+
+def stage_time(metrics):
+    # Per-operation stages compare on median latency, whole-run stages on total time
+    return metrics.get('p50_ms', metrics['seconds'] * 1000)
+
+
+def compare(result, baseline, threshold):
+    """Print the change of every stage against baseline; returns the names of regressed stages"""
+    print(f"\nCompared with {baseline['commit']}{' (dirty)' if baseline.get('dirty') else ''} "
+          f"from {baseline['timestamp']}:")
+    regressed = []
+    for name, metrics in result['stages'].items():
+        before = baseline['stages'].get(name)
+        if not before:
+            continue
+        old, new = stage_time(before), stage_time(metrics)
+        change = (new - old) / old if old else 0.0
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressed.append(name)
+        print(f"  {name:<16} {old:>10.3f} -> {new:>10.3f} ms  {change:+7.1%}{flag}")
+    return regressed
+
+
+def print_result(result):
+    print(f"Commit {result['commit']}{' (dirty)' if result['dirty'] else ''}, corpus {result['corpus']} "
+          f"({result['products']} products), stub latency {result['latency_ms']} ms")
+    print(f"  {'stage':<16} {'ops':>6} {'p50 ms':>10} {'p95 ms':>10} {'ops/s':>10} {'peak KB':>10}")
+    for name, m in result['stages'].items():
+        p50 = f"{m['p50_ms']:.3f}" if 'p50_ms' in m else '-'
+        p95 = f"{m['p95_ms']:.3f}" if 'p95_ms' in m else '-'
+        print(f"  {name:<16} {m['ops']:>6} {p50:>10} {p95:>10} {m['ops_per_s'] or 0:>10.1f} {m['peak_kb']:>10.1f}")
+
+
+# -------------------------------
+# Command Line Interface
+# -------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the NutriScan scan pipeline offline")
+    parser.add_argument('--products', type=int, default=500, help="corpus products to use (default: 500)")
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS_PATH, help="recorded corpus (synthetic if missing)")
+    parser.add_argument('--stages', default=','.join(STAGE_NAMES), help="comma-separated stages (default: all)")
+    parser.add_argument('--workers', type=int, default=8, help="workers for batch and dump stages (default: 8)")
+    parser.add_argument('--repeat', type=int, default=5,
+                        help="passes over the corpus for in-process stages; the fastest is kept (default: 5)")
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="stub server latency per request")
+    parser.add_argument('--compare', nargs='?', const='', metavar='COMMIT',
+                        help="compare with the latest run of COMMIT (default: of the previous commit)")
+    parser.add_argument('--threshold', type=float, default=0.15, help="slowdown flagged as regression (0.15 = 15%%)")
+    parser.add_argument('--no-save', action='store_true', help="do not append the results to .benchmarks/")
+    args = parser.parse_args(argv)
+
+    names = [name.strip() for name in args.stages.split(',') if name.strip()]
+    unknown = set(names) - set(STAGE_NAMES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    responses, corpus = get_corpus(args.corpus, args.products)
+    commit, dirty = current_commit()
+    result = {
+        'commit': commit,
+        'dirty': dirty,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'corpus': corpus,
+        'products': len(responses),
+        'latency_ms': args.latency_ms,
+        'stages': {},
+    }
+
+    with StubServer(responses, latency=args.latency_ms / 1000) as server:
+        stages = Stages(responses, server, args.workers, args.repeat)
+        for name in names:
+            print(f"Running {name}...", file=sys.stderr)
+            try:
+                result['stages'][name] = run_stage(stages, name)
+            except ImportError as e:  # Render stages need streamlit
+                print(f"  skipped: {e}", file=sys.stderr)
+
+    print_result(result)
+    previous = load_results()
+    if not args.no_save:
+        save_result(result)
+
+    if args.compare is not None:
+        baseline = find_baseline(previous, commit, args.compare or None)
+        if baseline is None:
+            print("\nNo earlier run to compare with", file=sys.stderr)
+        elif compare(result, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""Local stand-in for the Open Food Facts product endpoint, serving a benchmark corpus"""
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_PRODUCT_PATH = re.compile(r'/api/v0/product/(\d+)\.json')
+_NOT_FOUND = json.dumps({'status': 0, 'status_verbose': 'product not found'}).encode('utf-8')
+
+
+class StubServer:
+    """
+    Serves /api/v0/product/<barcode>.json from a corpus of API responses on 127.0.0.1
+    latency (seconds) is added to every response to mimic the network round trip
+    Use as a context manager; url is the base URL to give OpenFoodFactsClient
+    """
+
+    def __init__(self, responses, latency=0.0):
+        self.latency = latency
+        self.requests = 0
+        # Pre-encoded bodies, so serving costs as little as possible next to the code measured
+        self._bodies = {}
+        for response in responses:
+            body = json.dumps(response).encode('utf-8')
+            etag = f'"{response["product"].get("rev", 0)}"'
+            self._bodies[response['code'].lstrip('0')] = (body, etag)
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # Keep-alive, like the real API
+            disable_nagle_algorithm = True  # Headers and body are separate writes
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                stub.requests += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                match = _PRODUCT_PATH.match(self.path)
+                body, etag = stub._bodies.get(match.group(1).lstrip('0'), (_NOT_FOUND, None)) if match else \
+                    (_NOT_FOUND, None)
+                if etag and self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                if etag:
+                    self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
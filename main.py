@@ -2,13 +2,24 @@
 # Import required libraries
 # -------------------------------
 import streamlit as st
-import requests
-import re
+import html
 import math
+import os
+import time
+import uuid
 from datetime import datetime
-import plotly.graph_objects as go
-import plotly.express as px
 from collections import OrderedDict
+from nutriscan import metrics
+from nutriscan.cache import ProductCache
+from nutriscan.fetcher import ProductFetcher
+from nutriscan.history import HistoryStore
+from nutriscan.openfoodfacts import product_revision
+from nutriscan.gtin import short_code
+from nutriscan.records import Product
+from nutriscan.ingredients import ingredient_names
+from nutriscan.scoring import score_product
+from nutriscan.rules import SCORING_PROFILE
+from nutriscan.search import DEFAULT_SEARCH_PATH, ProductSearch
 
 # -------------------------------
 # Streamlit Page Configuration
@@ -23,540 +34,211 @@ st.set_page_config(
 # -------------------------------
 # Custom CSS for Light Theme and Professional Styling
 # -------------------------------
+# Stylesheet in static/, served by Streamlit's static file server (see .streamlit/config.toml)
+# and cached by the browser, so reruns only resend a <link> tag instead of the whole stylesheet
+CSS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "nutriscan.css")
+CSS_URL = "app/static/nutriscan.css"
+
+@st.cache_resource
+def get_inline_css():
+    # Fallback when static serving is off (e.g. the app is started without its config.toml)
+    with open(CSS_PATH, encoding='utf-8') as f:
+        return f"<style>{f.read()}</style>"
+
 def load_css():
-    st.markdown("""
-    <style>
-    /* Main styles */
-    * {
-        font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-    }
-    
-    .main {
-        background-color: #f8f9fa;
-    }
-    
-    /* Header styling */
-    .dashboard-header {
-        background: linear-gradient(135deg, #4CAF50 0%, #2E7D32 100%);
-        color: white;
-        padding: 25px 30px;
-        border-radius: 15px;
-        margin-bottom: 30px;
-        text-align: center;
-        box-shadow: 0 4px 20px rgba(0,0,0,0.12);
-    }
-    
-    .dashboard-header h1 {
-        font-size: 2.8rem;
-        font-weight: 700;
-        margin: 0 0 10px 0;
-    }
-    
-    .dashboard-header p {
-        font-size: 1.2rem;
-        opacity: 0.9;
-        margin: 0;
-    }
-    
-    /* Metric circles */
-    .metric-circle {
-        width: 150px;
-        height: 150px;
-        border-radius: 50%;
-        display: flex;
-        flex-direction: column;
-        justify-content: center;
-        align-items: center;
-        margin: 20px auto;
-        background: white;
-        border: 6px solid #4CAF50;
-        box-shadow: 0 6px 15px rgba(0,0,0,0.1);
-        transition: all 0.3s ease;
-    }
-    
-    .metric-circle:hover {
-        transform: translateY(-5px);
-        box-shadow: 0 12px 20px rgba(0,0,0,0.15);
-    }
-    
-    .metric-circle h2 {
-        font-size: 2.2rem;
-        font-weight: 700;
-        margin: 0;
-        color: #2E7D32;
-    }
-    
-    .metric-circle p {
-        margin: 5px 0 0;
-        font-size: 0.9rem;
-        color: #616161;
-    }
-    
-    /* Info cards */
-    .info-card {
-        background: white;
-        padding: 25px;
-        border-radius: 15px;
-        margin-bottom: 25px;
-        box-shadow: 0 5px 15px rgba(0,0,0,0.06);
-        border-left: 5px solid #4CAF50;
-    }
-    
-    .info-card h3 {
-        color: #2E7D32;
-        margin-top: 0;
-        margin-bottom: 20px;
-        font-weight: 600;
-        font-size: 1.4rem;
-        padding-bottom: 10px;
-        border-bottom: 1px solid #e0e0e0;
-    }
-    
-    /* Nutrition facts */
-    .nutrition-fact {
-        display: flex;
-        justify-content: space-between;
-        padding: 12px 0;
-        border-bottom: 1px solid #f1f3f4;
-    }
-    
-    .nutrition-fact:last-child {
-        border-bottom: none;
-    }
-    
-    /* Product image */
-    .product-image {
-        width: 100%;
-        max-width: 280px;
-        border-radius: 15px;
-        box-shadow: 0 8px 20px rgba(0,0,0,0.1);
-        border: 5px solid white;
-        margin: 0 auto;
-        display: block;
-    }
-    
-    /* Score styling */
-    .score-excellent {
-        color: #28a745;
-        font-weight: 700;
-    }
-    
-    .score-good {
-        color: #17a2b8;
-        font-weight: 700;
-    }
-    
-    .score-fair {
-        color: #ffc107;
-        font-weight: 700;
-    }
-    
-    .score-poor {
-        color: #fd7e14;
-        font-weight: 700;
-    }
-    
-    .score-very-poor {
-        color: #dc3545;
-        font-weight: 700;
-    }
-    
-    /* Ingredient styling */
-    .ingredient-positive {
-        color: #28a745;
-        font-weight: 500;
-    }
-    
-    .ingredient-negative {
-        color: #dc3545;
-        font-weight: 500;
-    }
-    
-    .ingredient-neutral {
-        color: #616161;
-    }
-    
-    /* History items */
-    .history-item {
-        background: white;
-        padding: 20px;
-        border-radius: 12px;
-        margin-bottom: 15px;
-        box-shadow: 0 4px 12px rgba(0,0,0,0.06);
-        transition: all 0.3s ease;
-        border-left: 4px solid #4CAF50;
-    }
-    
-    .history-item:hover {
-        transform: translateY(-3px);
-        box-shadow: 0 8px 15px rgba(0,0,0,0.1);
-    }
-    
-    /* Section titles */
-    .section-title {
-        color: #2E7D32;
-        font-weight: 600;
-        margin-bottom: 25px;
-        padding-bottom: 15px;
-        border-bottom: 2px solid #e0e0e0;
-        font-size: 1.8rem;
-    }
-    
-    /* Styling for tabs */
-    .stTabs [data-baseweb="tab-list"] {
-        gap: 8px;
-    }
-    
-    .stTabs [data-baseweb="tab"] {
-        height: 50px;
-        white-space: pre-wrap;
-        background-color: #f8f9fa;
-        border-radius: 8px 8px 0 0;
-        gap: 8px;
-        padding-top: 15px;
-        padding-bottom: 15px;
-        font-weight: 600;
-    }
-    
-    .stTabs [aria-selected="true"] {
-        background-color: #4CAF50;
-        color: white;
-    }
-    
-    /* Button styling */
-    .stButton button {
-        background: linear-gradient(135deg, #4CAF50 0%, #2E7D32 100%);
-        color: white;
-        border: none;
-        padding: 12px 24px;
-        border-radius: 8px;
-        cursor: pointer;
-        font-size: 16px;
-        font-weight: 600;
-        transition: all 0.3s ease;
-        box-shadow: 0 4px 12px rgba(76, 175, 80, 0.3);
-    }
-    
-    .stButton button:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 6px 16px rgba(76, 175, 80, 0.4);
-    }
-    
-    /* Input field styling */
-    .stTextInput input {
-        padding: 14px;
-        border: 2px solid #e0e6ed;
-        border-radius: 10px;
-        font-size: 16px;
-        transition: all 0.3s ease;
-    }
-    
-    .stTextInput input:focus {
-        border-color: #4CAF50;
-        box-shadow: 0 0 0 3px rgba(76, 175, 80, 0.1);
-    }
-    </style>
-    """, unsafe_allow_html=True)
+    if st.get_option("server.enableStaticServing"):
+        st.markdown(f'<link rel="stylesheet" href="{CSS_URL}">', unsafe_allow_html=True)
+    else:
+        st.markdown(get_inline_css(), unsafe_allow_html=True)
 
 # -------------------------------
-# Product Information Retrieval Function
+# Product Cache (shared by all sessions)
 # -------------------------------
-def get_product_info_openfoodfacts(barcode):
-    """Get product information from Open Food Facts API"""
-    # Clean the barcode - remove any non-digit characters
-    cleaned_barcode = re.sub(r'\D', '', barcode)
-    
-    if not cleaned_barcode:
-        return {"error": "Invalid barcode format", "success": False}
-    
-    url = f"https://world.openfoodfacts.org/api/v0/product/{cleaned_barcode}.json"
-    
+@st.cache_resource
+def get_product_cache():
+    return ProductCache()
+
+@st.cache_resource
+def get_product_fetcher():
+    # One fetcher per server process: concurrent scans of a barcode share one upstream call
+    return ProductFetcher(cache=get_product_cache())
+
+@st.cache_resource
+def get_history_store():
+    return HistoryStore()
+
+@st.cache_resource(max_entries=1)
+def get_score_index(path, mtime):
+    # Keyed on the file's mtime, so an index rebuilt by python -m nutriscan.ranking is picked up
+    from nutriscan.ranking import ScoreIndex
+    index = ScoreIndex.load(path)
+    # An index built with another scoring profile would rank incomparable scores
+    return index if index.scoring_version == SCORING_PROFILE.version else None
+
+def get_category_rank(product, score):
+    """Rank of the product within its category, or None when no score index has been built"""
+    # Imported on first scan: numpy is not needed to start the app
+    from nutriscan.ranking import DEFAULT_INDEX_PATH
     try:
-        response = requests.get(url, timeout=10)
-        data = response.json()
-        
-        if data.get('status') == 1:  # Product found
-            product = data['product']
-            return {
-                'name': product.get('product_name', 'Unknown'),
-                'brand': product.get('brands', 'Unknown'),
-                'category': product.get('categories', 'Unknown'),
-                'ingredients': product.get('ingredients_text', 'Unknown'),
-                'ingredients_list': product.get('ingredients', []),  # List of ingredients with details
-                'image_url': product.get('image_url', ''),
-                'nutrition_grade': product.get('nutrition_grade_fr', 'Unknown'),
-                'nutriments': product.get('nutriments', {}),
-                'additives': product.get('additives_tags', []),
-                'ingredients_analysis': product.get('ingredients_analysis_tags', []),
-                'source': 'Open Food Facts',
-                'success': True,
-                'barcode': cleaned_barcode
-            }
-        else:
-            return {"error": "Product not found in Open Food Facts", "success": False}
-    except Exception as e:
-        return {"error": f"API error: {str(e)}", "success": False}
+        mtime = os.stat(DEFAULT_INDEX_PATH).st_mtime
+    except OSError:
+        return None
+    index = get_score_index(DEFAULT_INDEX_PATH, mtime)
+    return index.rank(product.category, score) if index is not None else None
 
-# -------------------------------
-# Ingredients Extraction Function
-# -------------------------------
-def extract_ingredients_list(product_info):
-    """
-    Extract and format the list of ingredients used in the product
-    Returns a list of ingredient names
-    """
-    ingredients = []
-    
-    # Try to get from ingredients_list (structured data)
-    if product_info.get('ingredients_list'):
-        for ingredient in product_info['ingredients_list']:
-            if isinstance(ingredient, dict) and 'text' in ingredient:
-                ingredients.append(ingredient['text'])
-            elif isinstance(ingredient, str):
-                ingredients.append(ingredient)
-    
-    # If no structured data, try to parse ingredients_text
-    if not ingredients and product_info.get('ingredients'):
-        ingredients_text = product_info['ingredients']
-        # Simple parsing - split by commas and remove common prefixes
-        ingredients = [ing.strip() for ing in ingredients_text.split(',')]
-        
-        # Clean up common patterns
-        cleaned_ingredients = []
-        for ing in ingredients:
-            # Remove percentages and other annotations
-            ing = re.sub(r'\(.*?\)', '', ing)  # Remove parentheses content
-            ing = re.sub(r'\d+%', '', ing)     # Remove percentages
-            ing = re.sub(r'\d+\.?\d*\s*[a-zA-Z]*', '', ing)  # Remove quantities
-            ing = ing.strip()
-            
-            if ing and len(ing) > 2:  # Filter out very short strings
-                cleaned_ingredients.append(ing)
-        
-        ingredients = cleaned_ingredients
-    
-    return ingredients
+@st.cache_resource(max_entries=1)
+def get_alternatives_index(path, mtime):
+    # Memory-mapped, so every session and server process shares the index's pages
+    from nutriscan.alternatives import AlternativesIndex
+    index = AlternativesIndex.load(path)
+    return index if index.scoring_version == SCORING_PROFILE.version else None
+
+def get_healthier_alternatives(product, score):
+    """Similar products of the same category that score higher, or [] without an index"""
+    from nutriscan.alternatives import DEFAULT_INDEX_PATH
+    try:
+        mtime = os.stat(DEFAULT_INDEX_PATH).st_mtime
+    except OSError:
+        return []
+    index = get_alternatives_index(DEFAULT_INDEX_PATH, mtime)
+    if index is None:
+        return []
+    return index.alternatives(product.category, product.nutrients, score, product.barcode)
+
+@st.cache_resource(max_entries=1)
+def get_product_search(path, mtime):
+    # Read-only index, shared by all sessions; a rebuilt index is picked up through its mtime
+    return ProductSearch(path)
+
+def search_products(query):
+    """Products matching a name, brand or category query, best first ([] without an index)"""
+    try:
+        mtime = os.stat(DEFAULT_SEARCH_PATH).st_mtime
+    except OSError:
+        return []
+    with metrics.timed('search'):
+        return get_product_search(DEFAULT_SEARCH_PATH, mtime).search(query)
+
+# How long the Overview tab waits for a product image still downloading before it shows the
+# original URL instead (the browser then loads it from the CDN)
+IMAGE_WAIT_SECONDS = 0.5
+
+@st.cache_resource
+def get_image_cache():
+    # Thumbnails on local disk, shared by all sessions
+    from nutriscan.images import ImageCache
+    return ImageCache()
+
+@st.cache_resource
+def start_metrics_endpoint():
+    # Prometheus metrics on http://<host>:$NUTRISCAN_METRICS_PORT/ (off unless the port is set)
+    port = os.environ.get("NUTRISCAN_METRICS_PORT")
+    return metrics.start_http_server(int(port)) if port else None
 
 # -------------------------------
-# Health Score Calculation Function
+# Product Analysis (shared by all sessions)
 # -------------------------------
-def calculate_health_score(product_info):
-    """
-    Calculate a health score between 0-100 based on nutritional information and ingredients
-    Based on WHO guidelines, FDA recommendations, and nutritional science research
-    """
-    if not product_info.get('success', False):
-        return 0, "Cannot calculate score: Product information not available", {}
-    
-    nutriments = product_info.get('nutriments', {})
-    ingredients_text = product_info.get('ingredients', '').lower()
-    additives = product_info.get('additives', [])
-    
-    # Initialize score components
-    score_components = {
-        'energy': 0,
-        'sugar': 0,
-        'fat': 0,
-        'saturated_fat': 0,
-        'salt': 0,
-        'fiber': 0,
-        'protein': 0,
-        'additives': 0,
-        'ingredient_quality': 0
-    }
-    
-    # Maximum points for each category (total = 100)
-    max_points = {
-        'energy': 15,
-        'sugar': 15,
-        'fat': 15,
-        'saturated_fat': 10,
-        'salt': 10,
-        'fiber': 10,
-        'protein': 10,
-        'additives': 10,
-        'ingredient_quality': 5
-    }
+# Analyses kept in memory; least recently used ones are dropped past this
+ANALYSIS_CACHE_ENTRIES = 512
+
+def build_score_chart(score_components):
+    """Plotly figure spec (dict) of the health score breakdown"""
+    max_points = SCORING_PROFILE.max_points
     
-    explanations = []
+    categories = []
+    scores = []
+    max_scores = []
     
-    # 1. Energy density calculation (based on WHO guidelines)
-    energy = nutriments.get('energy_100g', 0)
-    if energy > 0:
-        # Convert kJ to kcal if needed
-        if energy > 1000:  # Likely in kJ
-            energy = energy / 4.184  # Convert kJ to kcal
-        
-        # Score based on energy density (kcal/100g)
-        if energy <= 150:
-            score_components['energy'] = max_points['energy']
-            explanations.append("Excellent: Low energy density (<150 kcal/100g)")
-        elif energy <= 250:
-            score_components['energy'] = max_points['energy'] * 0.7
-            explanations.append("Good: Moderate energy density (150-250 kcal/100g)")
-        elif energy <= 400:
-            score_components['energy'] = max_points['energy'] * 0.4
-            explanations.append("Fair: High energy density (250-400 kcal/100g)")
-        else:
-            score_components['energy'] = max_points['energy'] * 0.1
-            explanations.append("Poor: Very high energy density (>400 kcal/100g)")
-    
-    # 2. Sugar content (WHO recommends <10% of total energy from sugars)
-    sugar = nutriments.get('sugars_100g', 0)
-    if sugar > 0:
-        if sugar <= 5:
-            score_components['sugar'] = max_points['sugar']
-            explanations.append("Excellent: Low sugar content (<5g/100g)")
-        elif sugar <= 10:
-            score_components['sugar'] = max_points['sugar'] * 0.7
-            explanations.append("Good: Moderate sugar content (5-10g/100g)")
-        elif sugar <= 15:
-            score_components['sugar'] = max_points['sugar'] * 0.4
-            explanations.append("Fair: High sugar content (10-15g/100g)")
-        else:
-            score_components['sugar'] = max_points['sugar'] * 0.1
-            explanations.append("Poor: Very high sugar content (>15g/100g)")
-    
-    # 3. Total fat content
-    fat = nutriments.get('fat_100g', 0)
-    if fat > 0:
-        if fat <= 3:
-            score_components['fat'] = max_points['fat']
-            explanations.append("Excellent: Low fat content (<3g/100g)")
-        elif fat <= 10:
-            score_components['fat'] = max_points['fat'] * 0.7
-            explanations.append("Good: Moderate fat content (3-10g/100g)")
-        elif fat <= 20:
-            score_components['fat'] = max_points['fat'] * 0.4
-            explanations.append("Fair: High fat content (10-20g/100g)")
-        else:
-            score_components['fat'] = max_points['fat'] * 0.1
-            explanations.append("Poor: Very high fat content (>20g/100g)")
-    
-    # 4. Saturated fat content (WHO recommends <10% of total energy)
-    saturated_fat = nutriments.get('saturated-fat_100g', 0)
-    if saturated_fat > 0:
-        if saturated_fat <= 1.5:
-            score_components['saturated_fat'] = max_points['saturated_fat']
-            explanations.append("Excellent: Low saturated fat (<1.5g/100g)")
-        elif saturated_fat <= 5:
-            score_components['saturated_fat'] = max_points['saturated_fat'] * 0.7
-            explanations.append("Good: Moderate saturated fat (1.5-5g/100g)")
-        elif saturated_fat <= 10:
-            score_components['saturated_fat'] = max_points['saturated_fat'] * 0.4
-            explanations.append("Fair: High saturated fat (5-10g/100g)")
-        else:
-            score_components['saturated_fat'] = max_points['saturated_fat'] * 0.1
-            explanations.append("Poor: Very high saturated fat (>10g/100g)")
-    
-    # 5. Salt content (WHO recommends <5g/day)
-    salt = nutriments.get('salt_100g', 0)
-    if salt > 0:
-        if salt <= 0.3:
-            score_components['salt'] = max_points['salt']
-            explanations.append("Excellent: Low salt content (<0.3g/100g)")
-        elif salt <= 1.5:
-            score_components['salt'] = max_points['salt'] * 0.7
-            explanations.append("Good: Moderate salt content (0.3-1.5g/100g)")
-        elif salt <= 3:
-            score_components['salt'] = max_points['salt'] * 0.4
-            explanations.append("Fair: High salt content (1.5-3g/100g)")
-        else:
-            score_components['salt'] = max_points['salt'] * 0.1
-            explanations.append("Poor: Very high salt content (>3g/100g)")
-    
-    # 6. Fiber content (WHO recommends >25g/day)
-    fiber = nutriments.get('fiber_100g', 0)
-    if fiber > 0:
-        if fiber >= 6:
-            score_components['fiber'] = max_points['fiber']
-            explanations.append("Excellent: High fiber content (>6g/100g)")
-        elif fiber >= 3:
-            score_components['fiber'] = max_points['fiber'] * 0.7
-            explanations.append("Good: Moderate fiber content (3-6g/100g)")
-        elif fiber >= 1.5:
-            score_components['fiber'] = max_points['fiber'] * 0.4
-            explanations.append("Fair: Low fiber content (1.5-3g/100g)")
-        else:
-            score_components['fiber'] = max_points['fiber'] * 0.1
-            explanations.append("Poor: Very low fiber content (<1.5g/100g)")
-    
-    # 7. Protein content
-    protein = nutriments.get('proteins_100g', 0)
-    if protein > 0:
-        if protein >= 10:
-            score_components['protein'] = max_points['protein']
-            explanations.append("Excellent: High protein content (>10g/100g)")
-        elif protein >= 5:
-            score_components['protein'] = max_points['protein'] * 0.7
-            explanations.append("Good: Moderate protein content (5-10g/100g)")
-        elif protein >= 2:
-            score_components['protein'] = max_points['protein'] * 0.4
-            explanations.append("Fair: Low protein content (2-5g/100g)")
-        else:
-            score_components['protein'] = max_points['protein'] * 0.1
-            explanations.append("Poor: Very low protein content (<2g/100g)")
-    
-    # 8. Additives assessment
-    additives_count = len(additives)
-    if additives_count == 0:
-        score_components['additives'] = max_points['additives']
-        explanations.append("Excellent: No additives detected")
-    elif additives_count <= 2:
-        score_components['additives'] = max_points['additives'] * 0.7
-        explanations.append("Good: Few additives (1-2)")
-    elif additives_count <= 5:
-        score_components['additives'] = max_points['additives'] * 0.4
-        explanations.append("Fair: Moderate additives (3-5)")
-    else:
-        score_components['additives'] = max_points['additives'] * 0.1
-        explanations.append("Poor: Many additives (>5)")
-    
-    # 9. Ingredient quality assessment
-    # Check for presence of whole foods and absence of processed ingredients
-    ingredient_quality_score = 0
-    
-    # Positive indicators
-    whole_foods = ['whole grain', 'whole wheat', 'organic', 'natural', 'fresh', 'fruit', 'vegetable']
-    for indicator in whole_foods:
-        if indicator in ingredients_text:
-            ingredient_quality_score += 1
-    
-    # Negative indicators
-    processed_indicators = ['artificial', 'hydrogenated', 'high fructose', 'corn syrup', 'processed', 'modified starch']
-    for indicator in processed_indicators:
-        if indicator in ingredients_text:
-            ingredient_quality_score -= 1
-    
-    # Scale to max points
-    score_components['ingredient_quality'] = max(0, min(max_points['ingredient_quality'], 
-                                                       max_points['ingredient_quality'] * (ingredient_quality_score + 3) / 6))
-    
-    if ingredient_quality_score >= 3:
-        explanations.append("Excellent: High-quality ingredients with minimal processing")
-    elif ingredient_quality_score >= 0:
-        explanations.append("Good: Reasonable ingredient quality")
-    elif ingredient_quality_score >= -2:
-        explanations.append("Fair: Some processed ingredients detected")
-    else:
-        explanations.append("Poor: Many highly processed ingredients")
+    for category, score in score_components.items():
+        categories.append(category.replace('_', ' ').title())
+        scores.append(score)
+        max_scores.append(max_points[category])
     
-    # Calculate total score
-    total_score = sum(score_components.values())
+    # plotly is imported when the first chart is built, not at app startup
+    import plotly.graph_objects as go
     
-    # Ensure score is between 0-100
-    total_score = max(0, min(100, total_score))
+    # Create horizontal bar chart
+    fig = go.Figure()
+    fig.add_trace(go.Bar(
+        y=categories,
+        x=scores,
+        name='Actual Score',
+        orientation='h',
+        marker=dict(color='#4CAF50')
+    ))
+    fig.add_trace(go.Bar(
+        y=categories,
+        x=[max_scores[i] - scores[i] for i in range(len(scores))],
+        name='Remaining',
+        orientation='h',
+        marker=dict(color='#e0e0e0')
+    ))
     
-    return round(total_score), explanations, score_components
+    fig.update_layout(
+        barmode='stack',
+        title='Health Score Breakdown',
+        xaxis_title='Points',
+        yaxis_title='Category',
+        height=500,
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        font=dict(color='#424242'),
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+    )
+    return fig.to_dict()
+
+@st.cache_resource(max_entries=ANALYSIS_CACHE_ENTRIES)
+def get_product_analysis(barcode, revision, scoring_version, _product):
+    """
+    Score, parsed and classified ingredients and score chart of one product revision
+    Keyed on (barcode, revision, scoring version) only, so every session and rerun shares one
+    result; callers must treat it as read-only
+    """
+    with metrics.timed('score'):
+        result = score_product(_product)
+        score_components = dict(zip(SCORING_PROFILE.components, result.components))
+    with metrics.timed('ingredients'):
+        ingredients_list = ingredient_names(_product)
+        ingredient_flags = SCORING_PROFILE.classify_ingredients(ingredients_list)
+    with metrics.timed('chart'):
+        score_chart = build_score_chart(score_components)
+    return {
+        'score': result.score,
+        'explanations': result.explanations,
+        'score_components': score_components,
+        'ingredients_list': ingredients_list,
+        'ingredient_flags': ingredient_flags,
+        'score_chart': score_chart
+    }
 
 # -------------------------------
 # Session State Initialization
 # -------------------------------
+def _is_owner_id(owner):
+    try:
+        return uuid.UUID(owner).hex == owner
+    except (TypeError, ValueError):
+        return False
+
+def get_history_owner():
+    """
+    History owner id, kept in the URL (?user=...) so a reload or bookmark keeps the history
+    The link is the only key to the history: anyone given it can read and add to it (see the
+    History tab note); only ids this app generates are accepted
+    """
+    owner = st.query_params.get('user')
+    if not _is_owner_id(owner):
+        owner = uuid.uuid4().hex
+        st.query_params['user'] = owner
+    return owner
+
 def init_session_state():
-    if 'history' not in st.session_state:
-        st.session_state.history = []
+    if 'history_owner' not in st.session_state:
+        st.session_state.history_owner = get_history_owner()
     if 'current_product' not in st.session_state:
         st.session_state.current_product = None
+    if 'scan_timings' not in st.session_state:
+        st.session_state.scan_timings = None
 
 # -------------------------------
 # Header Rendering
@@ -590,40 +272,141 @@ def render_scan_section():
             type="primary"
         )
     
+    # Offered once a search index has been built (python -m nutriscan.search)
+    query = ""
+    if os.path.exists(DEFAULT_SEARCH_PATH):
+        query = st.text_input(
+            "Search products:",
+            placeholder="...or search by name, brand or category, e.g. nutella ferrero",
+            label_visibility="collapsed",
+            key="product_search"
+        )
+    
     if scan_clicked:
         if barcode:
-            with st.spinner("Scanning product information..."):
-                scan_product(barcode)
+            run_scan(barcode)
         else:
             st.error("Please enter a barcode to scan")
+    
+    if query.strip():
+        render_search_results(query)
+
+def render_search_results(query):
+    """Matches of the search box, each with a button that scans it"""
+    results = search_products(query)
+    if not results:
+        st.caption("No products match this search.")
+        return
+    
+    for result in results:
+        col1, col2 = st.columns([5, 1])
+        with col1:
+            st.markdown(ALTERNATIVE_HTML.format(
+                name=html.escape(result.name or 'Unknown'),
+                brand=html.escape(result.brand or 'Unknown'),
+                barcode=html.escape(short_code(result.barcode)),
+                score_class=get_score_class(result.score or 0),
+                score=result.score if result.score is not None else '-'
+            ), unsafe_allow_html=True)
+        with col2:
+            if st.button("Scan", key=f"search_scan_{result.barcode}", use_container_width=True):
+                run_scan(result.barcode)
+
+def run_scan(barcode):
+    with st.spinner("Scanning product information..."):
+        with metrics.trace() as scan_trace, metrics.timed('scan'):
+            scan_product(barcode)
+        st.session_state.scan_timings = scan_trace.timings
 
 def scan_product(barcode):
-    product_info = get_product_info_openfoodfacts(barcode)
+    # The lookup runs on the fetcher's event loop; this session only waits for its result
+    with metrics.timed('fetch'):
+        product_info = get_product_fetcher().fetch(barcode).result()
     
     if product_info.get('success', False):
-        # Calculate health score
-        health_score, explanations, score_components = calculate_health_score(product_info)
+        # The lookup's dict is converted once; the app keeps the compact record
+        product = Product.from_product_info(product_info)
         
-        # Add to history
-        st.session_state.history.append({
-            'barcode': barcode,
-            'name': product_info.get('name', 'Unknown'),
-            'score': health_score,
-            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M"),
-            **product_info
-        })
+        # The image downloads while the product is analysed; the Overview tab waits briefly for it
+        get_image_cache().prefetch([product.image_url])
+        
+        # Score, ingredients and chart are computed once per product revision, across sessions
+        analysis = get_product_analysis(
+            product.barcode, product_revision(product_info), SCORING_PROFILE.version, product
+        )
+        
+        # Add to history (summary only; the product itself stays in the product cache)
+        get_history_store().add(
+            st.session_state.history_owner,
+            product.barcode,
+            product.name,
+            product.brand,
+            analysis['score']
+        )
         
         st.session_state.current_product = {
-            'info': product_info,
-            'score': health_score,
-            'explanations': explanations,
-            'score_components': score_components
+            'product': product,
+            'ranking': get_category_rank(product, analysis['score']),
+            'alternatives': get_healthier_alternatives(product, analysis['score']),
+            **analysis
         }
         
-        st.success(f"✅ Successfully scanned: {product_info.get('name', 'Unknown')}")
+        st.success(f"✅ Successfully scanned: {product.name}")
     else:
         st.error(f"❌ {product_info.get('error', 'Unknown error')}")
 
+# -------------------------------
+# HTML Templates
+# -------------------------------
+# Lists are rendered as one HTML fragment per section (one st.markdown call), so a rerun
+# sends a fixed number of deltas however many ingredients or history items there are.
+# Templates are single lines or have no blank lines, so joined items stay one HTML block.
+NUTRITION_FACT_HTML = '<div class="nutrition-fact"><span><strong>{}</strong></span><span>{}</span></div>'
+EXPLANATION_HTML = (
+    "<div style='border-left: 4px solid {color}; padding-left: 15px; margin: 15px 0;'>"
+    "<p style='margin: 0;'><strong>{icon} {label}:</strong> {text}</p></div>"
+)
+INGREDIENT_HTML = '<p class="ingredient-{}">{}. {}</p>'
+ADDITIVE_HTML = '<li>{}</li>'
+def get_score_class(score):
+    """CSS class coloring a 0-100 health score"""
+    if score < 20:
+        return "score-very-poor"
+    if score < 40:
+        return "score-poor"
+    if score < 60:
+        return "score-fair"
+    if score < 80:
+        return "score-good"
+    return "score-excellent"
+
+ALTERNATIVE_HTML = (
+    '<div class="nutrition-fact"><span><strong>{name}</strong><br>'
+    '<small style="color: #7f8c8d;">{brand} • {barcode}</small></span>'
+    '<span class="{score_class}">{score}/100</span></div>'
+)
+HISTORY_ITEM_HTML = """<div class="history-item">
+    <div style="display: flex; justify-content: space-between; align-items: center;">
+        <div>
+            <h4 style="margin: 0 0 5px 0;">{name}</h4>
+            <p style="margin: 0; color: #7f8c8d;">{timestamp} • {brand}</p>
+        </div>
+        <div style="text-align: right;">
+            <div style="font-size: 24px; font-weight: 700;" class="{score_class}">{score}/100</div>
+            <p style="margin: 0; color: #7f8c8d;">Barcode: {barcode}</p>
+        </div>
+    </div>
+</div>"""
+
+# History date filter: label -> how far back, in days
+HISTORY_PERIODS = OrderedDict([
+    ("Any time", None),
+    ("Last 24 hours", 1),
+    ("Last 7 days", 7),
+    ("Last 30 days", 30)
+])
+HISTORY_PAGE_SIZE = 20
+
 # -------------------------------
 # Tab Rendering Functions
 # -------------------------------
@@ -632,7 +415,7 @@ def render_overview_tab():
         st.info("👆 Scan a product to get started")
         return
     
-    product_info = st.session_state.current_product['info']
+    product = st.session_state.current_product['product']
     health_score = st.session_state.current_product['score']
     
     # Create columns for layout
@@ -648,7 +431,7 @@ def render_overview_tab():
         """, unsafe_allow_html=True)
         
         # Nutrition grade metric circle
-        nutrition_grade = product_info.get('nutrition_grade', 'N/A').upper()
+        nutrition_grade = product.nutrition_grade.upper()
         st.markdown(f"""
         <div class="metric-circle" style="border-color: #3282b8;">
             <h2 style="color: #3282b8;">{nutrition_grade}</h2>
@@ -660,11 +443,11 @@ def render_overview_tab():
         st.markdown(f"""
         <div class="info-card">
             <h3>📦 Product Information</h3>
-            <p><strong>Product:</strong> {product_info.get('name', 'Unknown')}</p>
-            <p><strong>Brand:</strong> {product_info.get('brand', 'Unknown')}</p>
-            <p><strong>Category:</strong> {product_info.get('category', 'Unknown')}</p>
-            <p><strong>Barcode:</strong> {product_info.get('barcode', 'Unknown')}</p>
-            <p><strong>Data Source:</strong> {product_info.get('source', 'Open Food Facts')}</p>
+            <p><strong>Product:</strong> {html.escape(product.name or 'Unknown')}</p>
+            <p><strong>Brand:</strong> {html.escape(product.brand or 'Unknown')}</p>
+            <p><strong>Category:</strong> {html.escape(product.category or 'Unknown')}</p>
+            <p><strong>Barcode:</strong> {short_code(product.barcode)}</p>
+            <p><strong>Data Source:</strong> {product.source}</p>
         </div>
         """, unsafe_allow_html=True)
         
@@ -684,111 +467,89 @@ def render_overview_tab():
             score_class = "score-very-poor"
             score_text = "Very Poor"
         
+        ranking = st.session_state.current_product['ranking']
+        ranking_html = ""
+        if ranking:
+            ranking_html = (
+                f"<p>🏆 <strong>Top {max(1, math.ceil(ranking.top_percent))}%</strong> of "
+                f"{html.escape(ranking.category)} (#{ranking.rank} of {ranking.total})</p>"
+            )
+        
         st.markdown(f"""
         <div class="info-card">
             <h3>📋 Health Assessment</h3>
             <p>This product has a <span class="{score_class}">{score_text}</span> nutritional quality score.</p>
+            {ranking_html}
             <p>Based on comprehensive analysis of ingredients and nutritional content.</p>
         </div>
         """, unsafe_allow_html=True)
     
     with col2:
         # Product image
-        image_url = product_info.get('image_url', '')
+        image_url = product.image_url
         if image_url:
-            st.image(image_url, use_column_width=True, caption=product_info.get('name', 'Product Image'))
+            # Local WebP thumbnail; the original URL if it is not ready in time or could not be fetched
+            image = get_image_cache().cached(image_url, IMAGE_WAIT_SECONDS) or image_url
+            st.image(image, use_column_width=True, caption=product.name)
         else:
             st.info("No product image available")
         
         # Nutrition facts card
-        nutriments = product_info.get('nutriments', {})
-        st.markdown("""
+        nutrients = OrderedDict([
+            ('Energy', f"{product.nutrient('energy_100g'):g} kJ"),
+            ('Fat', f"{product.nutrient('fat_100g'):g}g"),
+            ('Saturated Fat', f"{product.nutrient('saturated-fat_100g'):g}g"),
+            ('Carbohydrates', f"{product.nutrient('carbohydrates_100g'):g}g"),
+            ('Sugars', f"{product.nutrient('sugars_100g'):g}g"),
+            ('Fiber', f"{product.nutrient('fiber_100g'):g}g"),
+            ('Protein', f"{product.nutrient('proteins_100g'):g}g"),
+            ('Salt', f"{product.nutrient('salt_100g'):g}g")
+        ])
+        
+        nutrition_rows = ''.join(NUTRITION_FACT_HTML.format(nutrient, value) for nutrient, value in nutrients.items())
+        st.markdown(f"""
         <div class="info-card">
             <h3>📊 Nutrition Facts (per 100g)</h3>
+            {nutrition_rows}
+        </div>
         """, unsafe_allow_html=True)
         
-        nutrients = OrderedDict([
-            ('Energy', f"{nutriments.get('energy_100g', 0)} kJ"),
-            ('Fat', f"{nutriments.get('fat_100g', 0)}g"),
-            ('Saturated Fat', f"{nutriments.get('saturated-fat_100g', 0)}g"),
-            ('Carbohydrates', f"{nutriments.get('carbohydrates_100g', 0)}g"),
-            ('Sugars', f"{nutriments.get('sugars_100g', 0)}g"),
-            ('Fiber', f"{nutriments.get('fiber_100g', 0)}g"),
-            ('Protein', f"{nutriments.get('proteins_100g', 0)}g"),
-            ('Salt', f"{nutriments.get('salt_100g', 0)}g")
-        ])
-        
-        for nutrient, value in nutrients.items():
+        # Healthier alternatives card (nearest products by nutrients that score higher)
+        alternatives = st.session_state.current_product['alternatives']
+        if alternatives:
+            alternative_rows = ''.join(
+                ALTERNATIVE_HTML.format(
+                    name=html.escape(alternative.name),
+                    brand=html.escape(alternative.brand),
+                    barcode=short_code(alternative.barcode),
+                    score=alternative.score,
+                    score_class=get_score_class(alternative.score)
+                )
+                for alternative in alternatives
+            )
             st.markdown(f"""
-            <div class="nutrition-fact">
-                <span><strong>{nutrient}</strong></span>
-                <span>{value}</span>
+            <div class="info-card">
+                <h3>💡 Healthier Alternatives</h3>
+                {alternative_rows}
             </div>
             """, unsafe_allow_html=True)
-        
-        st.markdown("</div>", unsafe_allow_html=True)
 
 def render_analysis_tab():
     if not st.session_state.current_product:
         st.info("👆 Scan a product to get started")
         return
     
-    product_info = st.session_state.current_product['info']
-    health_score = st.session_state.current_product['score']
-    score_components = st.session_state.current_product['score_components']
     explanations = st.session_state.current_product['explanations']
     
     st.markdown("<h2 class='section-title'>📈 Detailed Nutritional Analysis</h2>", unsafe_allow_html=True)
     
-    # Create a visualization of the score breakdown
-    max_points = {
-        'energy': 15, 'sugar': 15, 'fat': 15, 'saturated_fat': 10,
-        'salt': 10, 'fiber': 10, 'protein': 10, 'additives': 10, 'ingredient_quality': 5
-    }
-    
-    categories = []
-    scores = []
-    max_scores = []
-    
-    for category, score in score_components.items():
-        categories.append(category.replace('_', ' ').title())
-        scores.append(score)
-        max_scores.append(max_points[category])
-    
-    # Create horizontal bar chart
-    fig = go.Figure()
-    fig.add_trace(go.Bar(
-        y=categories,
-        x=scores,
-        name='Actual Score',
-        orientation='h',
-        marker=dict(color='#4CAF50')
-    ))
-    fig.add_trace(go.Bar(
-        y=categories,
-        x=[max_scores[i] - scores[i] for i in range(len(scores))],
-        name='Remaining',
-        orientation='h',
-        marker=dict(color='#e0e0e0')
-    ))
-    
-    fig.update_layout(
-        barmode='stack',
-        title='Health Score Breakdown',
-        xaxis_title='Points',
-        yaxis_title='Category',
-        height=500,
-        plot_bgcolor='white',
-        paper_bgcolor='white',
-        font=dict(color='#424242'),
-        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
-    )
-    
-    st.plotly_chart(fig, use_container_width=True)
+    # Score breakdown chart, prebuilt with the product analysis
+    st.plotly_chart(st.session_state.current_product['score_chart'], use_container_width=True)
     
     # Detailed explanations
     st.markdown("<h3 style='color:#2E7D32; margin-top: 30px;'>📋 Detailed Analysis</h3>", unsafe_allow_html=True)
     
+    explanation_rows = []
     for explanation in explanations:
         # Color code based on positive/negative
         if "Excellent" in explanation:
@@ -804,72 +565,62 @@ def render_analysis_tab():
             icon = "❌"
             color = "#e74c3c"
         
-        st.markdown(f"""
-        <div style='border-left: 4px solid {color}; padding-left: 15px; margin: 15px 0;'>
-            <p style='margin: 0;'><strong>{icon} {explanation.split(':')[0]}:</strong> {explanation.split(':')[1] if ':' in explanation else explanation}</p>
-        </div>
-        """, unsafe_allow_html=True)
+        explanation_rows.append(EXPLANATION_HTML.format(
+            color=color,
+            icon=icon,
+            label=explanation.split(':')[0],
+            text=explanation.split(':')[1] if ':' in explanation else explanation
+        ))
+    
+    st.markdown('\n'.join(explanation_rows), unsafe_allow_html=True)
 
 def render_ingredients_tab():
     if not st.session_state.current_product:
         st.info("👆 Scan a product to get started")
         return
     
-    product_info = st.session_state.current_product['info']
-    ingredients_list = extract_ingredients_list(product_info)
+    product = st.session_state.current_product['product']
+    ingredients_list = st.session_state.current_product['ingredients_list']
+    ingredient_flags = st.session_state.current_product['ingredient_flags']
     
     st.markdown("<h2 class='section-title'>🥗 Ingredients Analysis</h2>", unsafe_allow_html=True)
     
     # Display ingredients with color coding
-    positive_keywords = ['whole grain', 'whole wheat', 'organic', 'natural', 'fresh', 'fruit', 'vegetable', 'vitamin', 'mineral']
-    negative_keywords = ['artificial', 'preservative', 'hydrogenated', 'syrup', 'processed', 'additive', 'color', 'flavor']
-    
-    st.markdown("""
-    <div class="info-card">
-        <h3>📝 Ingredients List</h3>
-    """, unsafe_allow_html=True)
-    
-    for i, ingredient in enumerate(ingredients_list, 1):
-        # Check if ingredient contains positive or negative keywords
-        ingredient_lower = ingredient.lower()
-        is_positive = any(keyword in ingredient_lower for keyword in positive_keywords)
-        is_negative = any(keyword in ingredient_lower for keyword in negative_keywords)
-        
+    ingredient_rows = []
+    for i, (ingredient, (is_positive, is_negative)) in enumerate(zip(ingredients_list, ingredient_flags), 1):
         if is_positive:
-            st.markdown(f'<p class="ingredient-positive">{i}. {ingredient}</p>', unsafe_allow_html=True)
+            css_class = 'positive'
         elif is_negative:
-            st.markdown(f'<p class="ingredient-negative">{i}. {ingredient}</p>', unsafe_allow_html=True)
+            css_class = 'negative'
         else:
-            st.markdown(f'<p class="ingredient-neutral">{i}. {ingredient}</p>', unsafe_allow_html=True)
+            css_class = 'neutral'
+        ingredient_rows.append(INGREDIENT_HTML.format(css_class, i, html.escape(ingredient)))
     
-    st.markdown("</div>", unsafe_allow_html=True)
+    st.markdown(f"""
+    <div class="info-card">
+        <h3>📝 Ingredients List</h3>
+        {''.join(ingredient_rows)}
+    </div>
+    """, unsafe_allow_html=True)
     
     # Additives information
-    additives = product_info.get('additives', [])
+    additives = product.additives
     if additives:
         st.markdown("<h3 style='color:#2E7D32; margin-top: 30px;'>⚠️ Additives Detected</h3>", unsafe_allow_html=True)
         
-        st.markdown("""
+        additive_rows = ''.join(ADDITIVE_HTML.format(html.escape(additive)) for additive in additives)
+        st.markdown(f"""
         <div class="info-card">
             <p>This product contains the following additives:</p>
-            <ul>
-        """, unsafe_allow_html=True)
-        
-        for additive in additives:
-            st.markdown(f"<li>{additive}</li>", unsafe_allow_html=True)
-        
-        st.markdown("""
-            </ul>
+            <ul>{additive_rows}</ul>
         </div>
         """, unsafe_allow_html=True)
     
     # Ingredient quality summary
     st.markdown("<h3 style='color:#2E7D32; margin-top: 30px;'>📊 Ingredient Summary</h3>", unsafe_allow_html=True)
     
-    positive_count = sum(1 for ingredient in ingredients_list 
-                        if any(keyword in ingredient.lower() for keyword in positive_keywords))
-    negative_count = sum(1 for ingredient in ingredients_list 
-                        if any(keyword in ingredient.lower() for keyword in negative_keywords))
+    positive_count = sum(1 for is_positive, _ in ingredient_flags if is_positive)
+    negative_count = sum(1 for _, is_negative in ingredient_flags if is_negative)
     
     col1, col2, col3 = st.columns(3)
     
@@ -900,41 +651,101 @@ def render_ingredients_tab():
 def render_history_tab():
     st.markdown("<h2 class='section-title'>🕑 Scan History</h2>", unsafe_allow_html=True)
     
-    if not st.session_state.history:
+    history_store = get_history_store()
+    owner = st.session_state.history_owner
+    note = ("Your history is tied to this page's link (the ?user= part of the address): bookmark it to "
+            "keep your history, and do not share it, since anyone with the link can see and add to it.")
+    if history_store.max_age:
+        note += f" Histories with no scan for {history_store.max_age / 86400:g} days are deleted."
+    st.caption(note)
+    
+    if not history_store.count(owner):
         st.info("No scan history yet. Scan a product to start building history.")
         return
     
+    # Search and filters are applied in SQL; only the current page is loaded and rendered
+    col1, col2, col3, col4 = st.columns([3, 2, 2, 2])
+    with col1:
+        search = st.text_input("Search history", placeholder="Name, brand or barcode", key="history_search")
+    with col2:
+        brand = st.selectbox("Brand", ["All brands"] + history_store.brands(owner), key="history_brand")
+    with col3:
+        min_score, max_score = st.slider("Score", 0, 100, (0, 100), key="history_score")
+    with col4:
+        period = st.selectbox("Date", list(HISTORY_PERIODS), key="history_period")
+    
+    days = HISTORY_PERIODS[period]
+    filters = dict(
+        search=search.strip() or None,
+        brand=None if brand == "All brands" else brand,
+        min_score=min_score,
+        max_score=max_score,
+        since=time.time() - days * 86400 if days else None
+    )
+    total = history_store.count(owner, **filters)
+    pages = max(1, math.ceil(total / HISTORY_PAGE_SIZE))
+    if st.session_state.get('history_page', 1) > pages:
+        st.session_state.history_page = pages  # Filters narrowed the results
+    page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, step=1, key="history_page")
+    history_page = history_store.page(owner, page - 1, HISTORY_PAGE_SIZE, **filters)
+    
+    if not history_page.items:
+        st.info("No scans match these filters.")
+        return
+    
     # Display scan history
-    for item in st.session_state.history:
-        score_class = "score-excellent"
-        if item['score'] < 80:
-            score_class = "score-good"
-        if item['score'] < 60:
-            score_class = "score-fair"
-        if item['score'] < 40:
-            score_class = "score-poor"
-        if item['score'] < 20:
-            score_class = "score-very-poor"
-        
-        st.markdown(f"""
-        <div class="history-item">
-            <div style="display: flex; justify-content: space-between; align-items: center;">
-                <div>
-                    <h4 style="margin: 0 0 5px 0;">{item['name']}</h4>
-                    <p style="margin: 0; color: #7f8c8d;">{item['timestamp']} • {item.get('brand', 'Unknown')}</p>
-                </div>
-                <div style="text-align: right;">
-                    <div style="font-size: 24px; font-weight: 700;" class="{score_class}">{item['score']}/100</div>
-                    <p style="margin: 0; color: #7f8c8d;">Barcode: {item['barcode']}</p>
-                </div>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
+    history_items = []
+    for item in history_page.items:
+        history_items.append(HISTORY_ITEM_HTML.format(
+            name=html.escape(str(item.name)),
+            timestamp=datetime.fromtimestamp(item.scanned_at).strftime("%Y-%m-%d %H:%M"),
+            brand=html.escape(str(item.brand)),
+            score_class=get_score_class(item.score),
+            score=item.score,
+            barcode=html.escape(short_code(item.barcode))
+        ))
+    
+    st.markdown('\n'.join(history_items), unsafe_allow_html=True)
+    st.caption(f"{total} scans • showing {history_page.page * HISTORY_PAGE_SIZE + 1}-"
+               f"{history_page.page * HISTORY_PAGE_SIZE + len(history_page.items)}")
+
+# -------------------------------
+# Debug Panel
+# -------------------------------
+def render_timings(title, timings):
+    rows = ''.join(f"<tr><td>{stage}</td><td style='text-align: right;'>{seconds * 1000:.1f} ms</td></tr>"
+                   for stage, seconds in timings.items())
+    st.sidebar.markdown(f"**{title}**<table style='width: 100%;'>{rows}</table>", unsafe_allow_html=True)
+
+def render_debug_panel(render_trace):
+    """Opt-in sidebar panel with the timings of the last scan and of this rerun"""
+    if not st.sidebar.checkbox("🛠️ Show scan timings", key="debug_timings"):
+        return
+    
+    if st.session_state.scan_timings:
+        # Stages served from the product or analysis cache do not appear
+        render_timings("Last scan", st.session_state.scan_timings)
+    else:
+        st.sidebar.caption("No scan in this session yet")
+    render_timings("This rerun", render_trace.timings)
+    
+    hit_ratio = metrics.cache_hit_ratio()
+    error_rate = metrics.upstream_error_rate()
+    false_positive_rate = metrics.bloom_false_positive_rate()
+    st.sidebar.caption(
+        f"Server: cache hit ratio {'-' if hit_ratio is None else f'{hit_ratio:.0%}'} • "
+        f"upstream error rate {'-' if error_rate is None else f'{error_rate:.1%}'} • "
+        f"{metrics.FETCH_COALESCED.total()} coalesced lookups • "
+        f"{metrics.BLOOM_CHECKS.value(result='absent')} unknown barcodes answered locally "
+        f"(filter false positives {'-' if false_positive_rate is None else f'{false_positive_rate:.1%}'})"
+    )
 
 # -------------------------------
 # Main Application
 # -------------------------------
 def main():
+    start_metrics_endpoint()
+    
     # Load custom CSS
     load_css()
     
@@ -950,17 +761,20 @@ def main():
     # Create tabs
     tab1, tab2, tab3, tab4 = st.tabs(["📊 Overview", "📈 Analysis", "🥗 Ingredients", "🕑 History"])
     
-    with tab1:
-        render_overview_tab()
-    
-    with tab2:
-        render_analysis_tab()
-    
-    with tab3:
-        render_ingredients_tab()
+    with metrics.trace() as render_trace:
+        with tab1, metrics.timed('render_overview'):
+            render_overview_tab()
+        
+        with tab2, metrics.timed('render_analysis'):
+            render_analysis_tab()
+        
+        with tab3, metrics.timed('render_ingredients'):
+            render_ingredients_tab()
+        
+        with tab4, metrics.timed('render_history'):
+            render_history_tab()
     
-    with tab4:
-        render_history_tab()
+    render_debug_panel(render_trace)
 
 if __name__ == "__main__":
     main()
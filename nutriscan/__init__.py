@@ -0,0 +1 @@
+"""NutriScan Pro core: product lookup, caching and scoring helpers used by main.py"""
@@ -0,0 +1,226 @@
+"""
+Healthier alternatives: nearest neighbours by nutrient profile within a category
+
+    python -m nutriscan.alternatives --store catalog.sqlite3
+
+Builds, from the local product store (see nutriscan.dump), one scikit-learn KDTree per
+category over the products' scaled per-100g nutrient vectors (NUTRIENT_KEYS). The index is
+saved with joblib and memory-mapped when loaded, so apps share its pages and only touch the
+parts of the trees their queries visit.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from array import array
+from collections import namedtuple
+
+import numpy as np
+
+from nutriscan.openfoodfacts import normalize_product
+from nutriscan.ranking import MIN_CATEGORY_SIZE, product_categories
+from nutriscan.records import NUTRIENT_KEYS, Product
+from nutriscan.rules import SCORING_PROFILE, load_profile
+from nutriscan.scoring import score_product
+from nutriscan.store import DEFAULT_STORE_PATH, ProductStore
+
+# -------------------------------
+# Index Defaults
+# -------------------------------
+DEFAULT_INDEX_PATH = os.environ.get(
+    "NUTRISCAN_ALTERNATIVES_INDEX_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "nutriscan", "alternatives.joblib")
+)
+LEAF_SIZE = 40
+# Neighbours fetched per query round; doubled while too few of them score higher
+CANDIDATES = 32
+MAX_CANDIDATES = 1024
+
+Alternative = namedtuple('Alternative', ['barcode', 'name', 'brand', 'score', 'distance'])
+
+
+def _packed(texts):
+    """(uint8 buffer, int64 offsets) holding texts back to back, UTF-8 encoded"""
+    encoded = [text.encode('utf-8') for text in texts]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+# -------------------------------
+# Alternatives Index
+# -------------------------------
+class AlternativesIndex:
+    """
+    Products grouped by category: rows starts[i]:starts[i + 1] belong to category keys[i]
+    (lowercased, sorted) and trees[i] holds their scaled nutrient vectors. Each product is
+    indexed once, under the most specific of its categories with enough products
+    """
+
+    def __init__(self, keys, starts, trees, scale, scores, barcodes, labels, label_offsets, scoring_version):
+        self.keys = keys
+        self.starts = starts
+        self.trees = trees
+        self.scale = scale
+        self.scores = scores
+        self.barcodes = barcodes
+        self.labels = labels  # "name\x1fbrand" per row, packed (see _packed)
+        self.label_offsets = label_offsets
+        self.scoring_version = scoring_version
+
+    def __len__(self):
+        return len(self.scores)
+
+    def _label(self, row):
+        name, _, brand = bytes(self.labels[self.label_offsets[row]:self.label_offsets[row + 1]]) \
+            .decode('utf-8').partition('\x1f')
+        return name, brand
+
+    def _category(self, category):
+        key = category.lower()
+        i = np.searchsorted(self.keys, key)
+        return i if i < len(self.keys) and self.keys[i] == key else None
+
+    def alternatives(self, categories_text, nutrients, score, barcode=None, limit=5):
+        """
+        Up to limit products nearest in nutrients that score higher, from the product's most
+        specific indexed category that has any; nearest first
+        """
+        point = (np.asarray(nutrients, dtype=np.float64) / self.scale).reshape(1, -1)
+        for category in reversed(product_categories(categories_text)):
+            i = self._category(category)
+            if i is None:
+                continue
+            found = self._query(i, point, score, barcode, limit)
+            if found:
+                return found
+        return []
+
+    def _query(self, i, point, score, barcode, limit):
+        start, size = int(self.starts[i]), int(self.starts[i + 1] - self.starts[i])
+        k = min(CANDIDATES, size)
+        while True:
+            distances, rows = self.trees[i].query(point, k=k)
+            rows = rows[0] + start
+            better = (self.scores[rows] > score) & (self.barcodes[rows] != (barcode or '').encode('ascii'))
+            if better.sum() >= limit or k == size or k >= MAX_CANDIDATES:
+                break
+            k = min(k * 2, size)
+        found = []
+        for row, distance in zip(rows[better][:limit], distances[0][better][:limit]):
+            name, brand = self._label(row)
+            found.append(Alternative(self.barcodes[row].decode('ascii'), name, brand, int(self.scores[row]),
+                                     float(distance)))
+        return found
+
+    def save(self, path):
+        """Write the index atomically, so running apps never load a partial file"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = path + '.tmp'
+        # joblib and scikit-learn are only needed once an index is built or used, so the app
+        # starts (without alternatives) when they are not installed
+        import joblib
+        joblib.dump(self.__dict__, tmp_path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        import joblib
+        # mmap_mode: arrays, including the trees' own, stay in the page cache, not process memory
+        return cls(**joblib.load(path, mmap_mode='r'))
+
+
+def build_alternatives_index(products, scoring_version, min_category_size=MIN_CATEGORY_SIZE):
+    """Build an AlternativesIndex from (barcode, name, brand, categories_text, nutrients, score)"""
+    # Only building needs this import; loading an index unpickles the trees on its own
+    from sklearn.neighbors import KDTree
+
+    category_ids = {}  # lowercased category -> id
+    members = array('i')  # Category ids of every product, back to back
+    member_offsets = array('q', [0])
+    vectors = array('d')
+    scores = array('b')
+    barcodes = []
+    labels = []
+    for barcode, name, brand, categories_text, nutrients, score in products:
+        for category in product_categories(categories_text):
+            members.append(category_ids.setdefault(category.lower(), len(category_ids)))
+        member_offsets.append(len(members))
+        vectors.extend(nutrients)
+        scores.append(score)
+        barcodes.append(barcode)
+        labels.append(f"{name}\x1f{brand}")
+
+    # Each product goes to its most specific category with enough products; -1: none
+    sizes = np.bincount(np.frombuffer(members, dtype=np.int32), minlength=len(category_ids))
+    assigned = np.full(len(scores), -1, dtype=np.int64)
+    for row in range(len(scores)):
+        for category_id in reversed(members[member_offsets[row]:member_offsets[row + 1]]):
+            if sizes[category_id] >= min_category_size:
+                assigned[row] = category_id
+                break
+
+    keys = np.array(list(category_ids), dtype=str)
+    # Rows ordered by category key, so every category is one contiguous slice
+    key_rank = np.empty(len(keys), dtype=np.int64)
+    key_rank[np.argsort(keys)] = np.arange(len(keys))
+    rows = np.flatnonzero(assigned >= 0)
+    rows = rows[np.argsort(key_rank[assigned[rows]], kind='stable')]
+    used, counts = np.unique(key_rank[assigned[rows]], return_counts=True)
+
+    vectors = np.frombuffer(vectors, dtype=np.float64).reshape(-1, len(NUTRIENT_KEYS))[rows]
+    scale = vectors.std(axis=0) if len(vectors) else np.ones(len(NUTRIENT_KEYS))
+    scale[scale == 0] = 1.0
+    vectors /= scale
+    starts = np.zeros(len(used) + 1, dtype=np.int64)
+    np.cumsum(counts, out=starts[1:])
+    trees = [KDTree(vectors[starts[i]:starts[i + 1]], leaf_size=LEAF_SIZE) for i in range(len(used))]
+
+    labels, label_offsets = _packed([labels[row] for row in rows])
+    return AlternativesIndex(
+        np.sort(keys)[used],
+        starts,
+        trees,
+        scale,
+        np.frombuffer(scores, dtype=np.int8)[rows],
+        np.array([barcodes[row] for row in rows], dtype='S'),
+        labels,
+        label_offsets,
+        scoring_version
+    )
+
+
+def iter_store_products(store, profile=None):
+    """Yield build_alternatives_index input for every product in the store, scored with profile"""
+    for barcode, document in store.iter_rows(['barcode', 'product']):
+        product = Product.from_product_info(normalize_product(json.loads(document), barcode))
+        yield (barcode, product.name, product.brand, product.category, product.nutrients,
+               score_product(product, profile).score)
+
+
+# -------------------------------
+# Command Line Interface
+# -------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the healthier-alternatives index from the product store")
+    parser.add_argument('--store', default=DEFAULT_STORE_PATH, help=f"product store (default: {DEFAULT_STORE_PATH})")
+    parser.add_argument('-o', '--output', default=DEFAULT_INDEX_PATH, help=f"default: {DEFAULT_INDEX_PATH}")
+    parser.add_argument('--profile', help="scoring profile JSON (default: the active profile)")
+    parser.add_argument('--min-category-size', type=int, default=MIN_CATEGORY_SIZE,
+                        help=f"smallest category to index (default: {MIN_CATEGORY_SIZE})")
+    args = parser.parse_args(argv)
+
+    profile = load_profile(args.profile) if args.profile else SCORING_PROFILE
+    store = ProductStore(args.store)
+    started = time.perf_counter()
+    index = build_alternatives_index(iter_store_products(store, profile), profile.version, args.min_category_size)
+    index.save(args.output)
+    print(f"Indexed {len(index)} products in {len(index.trees)} categories in "
+          f"{time.perf_counter() - started:.1f}s -> {args.output}", file=sys.stderr)
+    store.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,218 @@
+"""
+Headless batch scoring of barcode catalogs
+
+    python -m nutriscan.batch barcodes.txt -o scores.jsonl --workers 16
+
+Barcodes are read one per line (extra CSV columns and '#' comments are ignored).
+Results are streamed to JSONL or CSV as they complete; re-running the same command
+after a crash skips every barcode already written to the output file.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from nutriscan import metrics
+from nutriscan.cache import ProductCache
+from nutriscan.openfoodfacts import get_product_info_openfoodfacts
+from nutriscan.records import Product
+from nutriscan.ingredients import ingredient_names
+from nutriscan.scoring import score_product
+from nutriscan.rules import SCORING_PROFILE, load_profile
+
+RECORD_FIELDS = ['barcode', 'success', 'name', 'brand', 'score', 'ingredients_count', 'error']
+
+
+# -------------------------------
+# Python API
+# -------------------------------
+def read_barcodes(path):
+    """Yield barcodes from a text/CSV file, one per line (first column only)"""
+    with open(path, newline='', encoding='utf-8') as f:
+        for line in f:
+            barcode = line.split(',', 1)[0].strip()
+            if barcode and not barcode.startswith('#') and barcode.lower() != 'barcode':
+                yield barcode
+
+
+def score_barcode(barcode, cache=None, client=None, profile=None, image_cache=None):
+    """
+    Fetch, parse and score one barcode; errors are returned in the record, never raised
+    With an image_cache, the product image is prefetched in the background
+    """
+    try:
+        product_info = get_product_info_openfoodfacts(barcode, cache=cache, client=client)
+        if not product_info.get('success', False):
+            return {'barcode': barcode, 'success': False, 'error': product_info.get('error', 'Unknown error')}
+
+        profile = profile or SCORING_PROFILE
+        product = Product.from_product_info(product_info)
+        if image_cache is not None:
+            image_cache.prefetch([product.image_url])
+        with metrics.timed('score'):
+            result = score_product(product, profile)
+        with metrics.timed('ingredients'):
+            ingredients_count = len(ingredient_names(product))
+        return {
+            'barcode': barcode,
+            'success': True,
+            'name': product.name,
+            'brand': product.brand,
+            'score': result.score,
+            'ingredients_count': ingredients_count,
+            'components': dict(zip(profile.components, result.components))
+        }
+    except Exception as e:
+        return {'barcode': barcode, 'success': False, 'error': f"Scoring error: {str(e)}"}
+
+
+def score_barcodes(barcodes, workers=8, cache=None, client=None, profile=None, image_cache=None):
+    """
+    Score barcodes concurrently on a bounded worker pool, yielding records as they complete
+    At most 2 * workers barcodes are in flight, so arbitrarily large inputs use constant memory
+    """
+    barcodes = iter(barcodes)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for barcode in barcodes:
+            pending.add(executor.submit(score_barcode, barcode, cache, client, profile, image_cache))
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in pending:
+            yield future.result()
+
+
+def is_final(record):
+    """Whether a record needs no retry on resume (transient API errors are retried)"""
+    return record.get('success') or not record.get('error', '').startswith('API error')
+
+
+# -------------------------------
+# Output Writers
+# -------------------------------
+class JsonlWriter:
+    def __init__(self, f):
+        self.f = f
+
+    def write(self, record):
+        self.f.write(json.dumps(record) + '\n')
+        self.f.flush()
+
+
+class CsvWriter:
+    def __init__(self, f, write_header, profile=None):
+        self.f = f
+        components = (profile or SCORING_PROFILE).components
+        self.writer = csv.DictWriter(f, fieldnames=RECORD_FIELDS + components, extrasaction='ignore')
+        if write_header:
+            self.writer.writeheader()
+
+    def write(self, record):
+        row = dict(record)
+        row.update(record.get('components') or {})
+        self.writer.writerow(row)
+        self.f.flush()
+
+
+def load_completed(path, fmt):
+    """
+    Return the barcodes already finished in an existing output file
+    A trailing partial line left by a crash is truncated so appending stays valid
+    """
+    if not os.path.exists(path):
+        return set()
+
+    with open(path, 'rb+') as f:
+        data = f.read()
+        end = data.rfind(b'\n') + 1
+        if end < len(data):
+            f.truncate(end)
+    lines = data[:end].decode('utf-8').splitlines()
+
+    completed = set()
+    if fmt == 'csv':
+        for row in csv.DictReader(lines):
+            if is_final({'success': row.get('success') == 'True', 'error': row.get('error') or ''}):
+                completed.add(row['barcode'])
+    else:
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if is_final(record):
+                completed.add(record['barcode'])
+    return completed
+
+
+# -------------------------------
+# Command Line Interface
+# -------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a file of barcodes with the NutriScan health score")
+    parser.add_argument('input', help="file with one barcode per line")
+    parser.add_argument('-o', '--output', required=True, help="results file (.jsonl or .csv)")
+    parser.add_argument('--format', choices=['jsonl', 'csv'], help="defaults to the output file extension")
+    parser.add_argument('--workers', type=int, default=8, help="concurrent lookups (default: 8)")
+    parser.add_argument('--no-cache', action='store_true', help="do not read or fill the product cache")
+    parser.add_argument('--overwrite', action='store_true', help="start over instead of resuming")
+    parser.add_argument('--profile', help="scoring profile JSON (default: the built-in profile)")
+    parser.add_argument('--prefetch-images', action='store_true',
+                        help="also fill the app's image cache with the products' thumbnails")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ('csv' if args.output.endswith('.csv') else 'jsonl')
+    if args.overwrite and os.path.exists(args.output):
+        os.remove(args.output)
+    completed = load_completed(args.output, fmt)
+    skipped = len(completed)
+    cache = None if args.no_cache else ProductCache()
+    profile = load_profile(args.profile) if args.profile else SCORING_PROFILE
+    image_cache = None
+    if args.prefetch_images:
+        from nutriscan.images import ImageCache
+        image_cache = ImageCache()
+
+    def pending_barcodes():
+        # Also drops duplicates within the input file
+        for barcode in read_barcodes(args.input):
+            if barcode not in completed:
+                completed.add(barcode)
+                yield barcode
+
+    started = time.perf_counter()
+    total = succeeded = 0
+
+    with open(args.output, 'a', newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            writer = CsvWriter(f, write_header=f.tell() == 0, profile=profile)
+        else:
+            writer = JsonlWriter(f)
+
+        for record in score_barcodes(pending_barcodes(), workers=args.workers, cache=cache, profile=profile,
+                                     image_cache=image_cache):
+            writer.write(record)
+            total += 1
+            succeeded += bool(record['success'])
+            if total % 1000 == 0:
+                elapsed = time.perf_counter() - started
+                print(f"{total} scored, {total / elapsed:.1f}/s", file=sys.stderr)
+
+    if image_cache is not None:
+        image_cache.close()  # Let the queued image downloads finish
+    elapsed = time.perf_counter() - started
+    print(
+        f"Scored {total} barcodes in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.1f}/s): "
+        f"{succeeded} ok, {total - succeeded} errors, {skipped} skipped from previous run",
+        file=sys.stderr
+    )
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
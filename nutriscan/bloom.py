@@ -0,0 +1,260 @@
+"""
+Bloom filter of the barcodes Open Food Facts knows about
+
+    python -m nutriscan.bloom build --store catalog.sqlite3
+    python -m nutriscan.bloom add --dump openfoodfacts-delta.jsonl.gz
+
+A barcode the filter does not contain is definitely not in the data it was built from, so
+lookups of unknown products are answered locally instead of with an API round trip. The
+filter is a file (header + bit array) that apps memory-map read-only; `add` sets bits in
+place, so running apps see a refresh immediately. Products added upstream after the last
+refresh would be reported as unknown, so a filter older than NUTRISCAN_BLOOM_MAX_AGE_DAYS
+is not used.
+"""
+import argparse
+import hashlib
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+
+from nutriscan.gtin import InvalidBarcode, normalize_gtin
+
+# -------------------------------
+# Filter Defaults
+# -------------------------------
+DEFAULT_BLOOM_PATH = os.environ.get(
+    "NUTRISCAN_BLOOM_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "nutriscan", "known_barcodes.bloom")
+)
+DEFAULT_MAX_AGE = float(os.environ.get("NUTRISCAN_BLOOM_MAX_AGE_DAYS", "7")) * 24 * 3600
+DEFAULT_FP_RATE = 0.01
+# build refuses smaller sources: a filter of an empty or wrong catalog would report nearly
+# every barcode as unknown
+MIN_BUILD_BARCODES = 1000
+# Room for products added by later refreshes before the false positive rate degrades
+CAPACITY_HEADROOM = 1.25
+
+# magic, bits, hash count, keys added, last refresh (epoch seconds)
+_HEADER = struct.Struct('<8sQIQd')
+_MAGIC = b'NSBLOOM1'
+
+
+class BloomFilter:
+    """
+    Memory-mapped Bloom filter over GTIN-14 keys (see nutriscan.gtin)
+    Bit positions use double hashing of one BLAKE2b digest per key
+    """
+
+    def __init__(self, path, writable=False):
+        self.path = path
+        self.writable = writable
+        self._file = open(path, 'r+b' if writable else 'rb')
+        try:
+            # mmap raises ValueError for an empty file
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+            if len(self._map) < _HEADER.size or self._map[:len(_MAGIC)] != _MAGIC:
+                raise ValueError(f"{path} is not a barcode Bloom filter")
+            _, self.num_bits, self.num_hashes, _, _ = _HEADER.unpack_from(self._map)
+            if self.num_bits == 0 or len(self._map) < _HEADER.size + (self.num_bits + 7) // 8:
+                raise ValueError(f"{path} is truncated")
+        except Exception:
+            self._file.close()
+            raise
+
+    @classmethod
+    def create(cls, path, capacity, fp_rate=DEFAULT_FP_RATE):
+        """New empty filter sized for capacity keys at fp_rate, opened for writing"""
+        capacity = max(int(capacity), 1)
+        num_bits = max(64, math.ceil(-capacity * math.log(fp_rate) / math.log(2) ** 2))
+        num_hashes = max(1, round(num_bits / capacity * math.log(2)))
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(_HEADER.pack(_MAGIC, num_bits, num_hashes, 0, time.time()))
+            f.truncate(_HEADER.size + (num_bits + 7) // 8)
+        return cls(path, writable=True)
+
+    @property
+    def count(self):
+        # Keys that already tested present when added (false positives) are not counted
+        return _HEADER.unpack_from(self._map)[3]
+
+    @property
+    def refreshed_at(self):
+        return _HEADER.unpack_from(self._map)[4]
+
+    def estimated_fp_rate(self):
+        """Expected false positive rate at the current number of keys"""
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('ascii'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def __contains__(self, key):
+        bits = self._map
+        for position in self._positions(key):
+            if not bits[_HEADER.size + (position >> 3)] & (1 << (position & 7)):
+                return False
+        return True
+
+    def add_many(self, keys):
+        """Add keys (GTIN-14 strings); returns how many were new to the filter"""
+        bits = self._map
+        added = 0
+        for key in keys:
+            new = False
+            for position in self._positions(key):
+                offset = _HEADER.size + (position >> 3)
+                mask = 1 << (position & 7)
+                if not bits[offset] & mask:
+                    bits[offset] |= mask
+                    new = True
+            added += new
+        _, num_bits, num_hashes, count, _ = _HEADER.unpack_from(bits)
+        _HEADER.pack_into(bits, 0, _MAGIC, num_bits, num_hashes, count + added, time.time())
+        bits.flush()
+        return added
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+# -------------------------------
+# Process-wide Default Filter
+# -------------------------------
+_default_filter = None
+_default_inode = None
+_default_lock = threading.Lock()
+
+
+def get_default_filter(path=DEFAULT_BLOOM_PATH, max_age=DEFAULT_MAX_AGE):
+    """
+    The filter at path, shared by every lookup in this process and reopened when the file is
+    rebuilt; None (lookups go upstream) if there is none, it cannot be read, or it was last
+    refreshed more than max_age seconds ago
+    """
+    global _default_filter, _default_inode
+    try:
+        inode = os.stat(path).st_ino
+    except OSError:
+        return None
+    if inode != _default_inode:
+        with _default_lock:
+            if inode != _default_inode:
+                # The replaced filter is not closed: lookups still holding it may be reading it,
+                # and its mapping is released with the last reference
+                try:
+                    _default_filter = BloomFilter(path)
+                except (OSError, ValueError):
+                    # Empty, truncated or foreign file; remembered until it is replaced
+                    _default_filter = None
+                _default_inode = inode
+    bloom = _default_filter
+    if bloom is None:
+        return None
+    return bloom if time.time() - bloom.refreshed_at <= max_age else None
+
+
+# -------------------------------
+# Barcode Sources
+# -------------------------------
+def iter_store_barcodes(path):
+    from nutriscan.store import ProductStore
+
+    # ProductStore would create a missing store, i.e. an empty barcode source
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No product store at {path}")
+    store = ProductStore(path)
+    try:
+        for (barcode,) in store.iter_rows(['barcode']):
+            yield barcode
+    finally:
+        store.close()
+
+
+def iter_dump_barcodes(path):
+    """GTIN-14s of the products in a JSONL or CSV dump (see nutriscan.dump); invalid codes skipped"""
+    from nutriscan.dump import is_csv_dump, open_dump
+
+    with open_dump(path) as f:
+        column = f.readline().rstrip('\r\n').split('\t').index('code') if is_csv_dump(path) else None
+        for line in f:
+            try:
+                code = line.split('\t')[column] if column is not None else json.loads(line).get('code', '')
+                yield normalize_gtin(str(code))
+            except (ValueError, IndexError, InvalidBarcode):
+                continue
+
+
+def _barcodes(args):
+    return iter_dump_barcodes(args.dump) if args.dump else iter_store_barcodes(args.store)
+
+
+# -------------------------------
+# Command Line Interface
+# -------------------------------
+def main(argv=None):
+    from nutriscan.store import DEFAULT_STORE_PATH
+
+    parser = argparse.ArgumentParser(description="Build or refresh the Bloom filter of known barcodes")
+    parser.add_argument('command', choices=['build', 'add', 'info'],
+                        help="build a new filter, add barcodes to the existing one, or describe it")
+    parser.add_argument('-f', '--filter', default=DEFAULT_BLOOM_PATH, help=f"default: {DEFAULT_BLOOM_PATH}")
+    parser.add_argument('--store', default=DEFAULT_STORE_PATH, help=f"barcodes source (default: {DEFAULT_STORE_PATH})")
+    parser.add_argument('--dump', help="read barcodes from this JSONL/CSV dump instead of the store")
+    parser.add_argument('--capacity', type=int,
+                        help=f"keys to size the filter for (default: {CAPACITY_HEADROOM}x the barcodes found)")
+    parser.add_argument('--fp-rate', type=float, default=DEFAULT_FP_RATE,
+                        help=f"target false positive rate (default: {DEFAULT_FP_RATE})")
+    parser.add_argument('--min-barcodes', type=int, default=MIN_BUILD_BARCODES,
+                        help=f"refuse to build from fewer barcodes (default: {MIN_BUILD_BARCODES})")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    if args.command == 'build':
+        try:
+            barcodes = list(_barcodes(args))
+        except FileNotFoundError as e:
+            print(e, file=sys.stderr)
+            return 1
+        if len(barcodes) < max(args.min_barcodes, 1):
+            print(f"Only {len(barcodes)} barcodes in {args.dump or args.store}; not building a filter "
+                  f"(see --min-barcodes)", file=sys.stderr)
+            return 1
+        capacity = args.capacity or len(barcodes) * CAPACITY_HEADROOM
+        # Built next to the live file and swapped in, so apps never see a partial filter
+        tmp_path = args.filter + '.tmp'
+        bloom = BloomFilter.create(tmp_path, capacity, args.fp_rate)
+        bloom.add_many(barcodes)
+        bloom.close()
+        os.replace(tmp_path, args.filter)
+    elif args.command == 'add':
+        bloom = BloomFilter(args.filter, writable=True)
+        try:
+            added = bloom.add_many(_barcodes(args))
+        except FileNotFoundError as e:
+            print(e, file=sys.stderr)
+            return 1
+        finally:
+            bloom.close()
+        print(f"Added {added} new barcodes", file=sys.stderr)
+
+    bloom = BloomFilter(args.filter)
+    print(f"{args.filter}: ~{bloom.count} barcodes, {bloom.num_bits / 8 / 1024:.0f} KB, "
+          f"{bloom.num_hashes} hashes, estimated false positive rate {bloom.estimated_fp_rate():.2%}, "
+          f"refreshed {time.strftime('%Y-%m-%d %H:%M', time.localtime(bloom.refreshed_at))} "
+          f"({time.perf_counter() - started:.1f}s)", file=sys.stderr)
+    bloom.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
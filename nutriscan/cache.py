@@ -0,0 +1,118 @@
+"""Persistent on-disk cache for Open Food Facts product lookups"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+# -------------------------------
+# Cache Defaults
+# -------------------------------
+DEFAULT_CACHE_PATH = os.environ.get(
+    "NUTRISCAN_CACHE_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "nutriscan", "products.sqlite3")
+)
+DEFAULT_TTL = 7 * 24 * 3600           # Found products are kept for a week
+DEFAULT_NEGATIVE_TTL = 6 * 3600       # "Product not found" answers are rechecked sooner
+DEFAULT_MAX_ENTRIES = 50000
+
+# fresh is False once the TTL has passed; stale entries are kept so they can be revalidated
+CacheEntry = namedtuple('CacheEntry', ['product_info', 'fresh', 'etag', 'last_modified'])
+
+
+class ProductCache:
+    """
+    SQLite-backed product cache keyed on the GTIN-14 (see nutriscan.gtin)
+    Entries expire after a TTL, the least recently used ones are evicted past max_entries,
+    and "Product not found" results are cached too (with a shorter TTL)
+    Expired entries keep their ETag / Last-Modified so the client can revalidate them
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=DEFAULT_TTL,
+                 negative_ttl=DEFAULT_NEGATIVE_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # Streamlit serves each session from its own thread, so share one connection behind a lock
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS products (
+                barcode TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                found INTEGER NOT NULL,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                etag TEXT,
+                last_modified TEXT
+            )
+        """)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(products)")}
+        for column in ('etag', 'last_modified'):
+            if column not in columns:  # Cache files created before conditional requests
+                self._conn.execute(f"ALTER TABLE products ADD COLUMN {column} TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_products_accessed ON products (accessed_at)")
+
+    def get(self, barcode):
+        """Return the cached lookup result for a barcode, or None if missing or expired"""
+        entry = self.get_entry(barcode)
+        if entry is None or not entry.fresh:
+            return None
+        return entry.product_info
+
+    def get_entry(self, barcode):
+        """Return the CacheEntry for a barcode (fresh or stale), or None on a miss"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, found, stored_at, etag, last_modified FROM products WHERE barcode = ?",
+                (barcode,)
+            ).fetchone()
+            if row is None:
+                return None
+            payload, found, stored_at, etag, last_modified = row
+            self._conn.execute("UPDATE products SET accessed_at = ? WHERE barcode = ?", (now, barcode))
+        ttl = self.ttl if found else self.negative_ttl
+        return CacheEntry(json.loads(payload), now - stored_at <= ttl, etag, last_modified)
+
+    def put(self, barcode, product_info, etag=None, last_modified=None):
+        """Store a lookup result; failed lookups are stored as negative entries"""
+        now = time.time()
+        found = 1 if product_info.get('success', False) else 0
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO products "
+                "(barcode, payload, found, stored_at, accessed_at, etag, last_modified) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (barcode, json.dumps(product_info), found, now, now, etag, last_modified)
+            )
+            self._evict()
+
+    def refresh(self, barcode):
+        """Restart the TTL of an entry the server confirmed is unchanged (304 Not Modified)"""
+        with self._lock:
+            self._conn.execute("UPDATE products SET stored_at = ? WHERE barcode = ?", (time.time(), barcode))
+
+    def _evict(self):
+        """Drop the least recently used entries once the cache grows past max_entries"""
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM products").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM products WHERE barcode IN "
+                "(SELECT barcode FROM products ORDER BY accessed_at LIMIT ?)",
+                (overflow,)
+            )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM products")
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
@@ -0,0 +1,152 @@
+"""Pooled HTTP client for the Open Food Facts API"""
+import json
+import os
+import random
+import threading
+import time
+from collections import namedtuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from nutriscan import metrics
+
+# -------------------------------
+# Client Defaults
+# -------------------------------
+OFF_PUBLIC_URL = "https://world.openfoodfacts.org"
+# Point the app at a local mirror (python -m nutriscan.mirror) instead of the public API
+OFF_BASE_URL = os.environ.get("NUTRISCAN_OFF_BASE_URL", OFF_PUBLIC_URL)
+USER_AGENT = "NutriScanPro/1.0 (https://github.com/dineshpaluri043-code/packaged-food-rating-app)"
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+# Only the product fields the app actually reads are requested from the API
+PRODUCT_FIELDS = (
+    'code', 'rev', 'product_name', 'brands', 'categories', 'ingredients_text', 'ingredients',
+    'image_url', 'nutrition_grade_fr', 'nutriments', 'additives_tags', 'ingredients_analysis_tags'
+)
+MAX_BODY_BYTES = 2 * 1024 * 1024
+CHUNK_SIZE = 16 * 1024
+
+# data is the decoded JSON body, or None when the server answered 304 Not Modified
+# body_bytes / parse_seconds describe the download, for comparing projected vs full fetches
+ProductResponse = namedtuple(
+    'ProductResponse',
+    ['data', 'not_modified', 'etag', 'last_modified', 'body_bytes', 'parse_seconds']
+)
+
+
+class OpenFoodFactsClient:
+    """
+    Shared requests.Session with a keep-alive connection pool, bounded retries with
+    jittered exponential backoff, and ETag / If-Modified-Since revalidation
+    """
+
+    def __init__(self, base_url=OFF_BASE_URL, timeout=10, retries=3, backoff=0.3, pool_size=16,
+                 fields=PRODUCT_FIELDS):
+        self.base_url = base_url.rstrip('/')
+        self.fields = fields
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = USER_AGENT
+        # Retries are handled in _get so they can be jittered and cover JSON endpoints uniformly
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def get_product(self, barcode, etag=None, last_modified=None):
+        """Fetch the product document for a barcode, revalidating against cached validators"""
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+        params = {'fields': ','.join(self.fields)} if self.fields else None
+
+        # Until the response headers arrive: connection setup (DNS, TCP, TLS) when no pooled
+        # connection is free, server time, and any retries
+        with metrics.timed('upstream'):
+            response = self._get(f"{self.base_url}/api/v0/product/{barcode}.json", headers, params)
+        with response:
+            if response.status_code == 304:
+                return ProductResponse(None, True, etag, last_modified, 0, 0.0)
+            if response.status_code in RETRY_STATUSES:
+                response.raise_for_status()
+            with metrics.timed('download'):
+                body = self._read_body(response)
+
+        started = time.perf_counter()
+        data = json.loads(body)
+        parse_seconds = time.perf_counter() - started
+        metrics.observe('parse', parse_seconds)
+        return ProductResponse(
+            data,
+            False,
+            response.headers.get('ETag'),
+            response.headers.get('Last-Modified'),
+            len(body),
+            parse_seconds
+        )
+
+    def get_bytes(self, url, max_bytes=MAX_BODY_BYTES):
+        """Download any other resource (e.g. a product image) over the pooled session"""
+        response = self._get(url, {}, retries_metric=metrics.DOWNLOAD_RETRIES)
+        with response:
+            response.raise_for_status()
+            return self._read_body(response, max_bytes)
+
+    def _read_body(self, response, max_bytes=MAX_BODY_BYTES):
+        """Read a streamed body chunk by chunk, refusing documents larger than max_bytes"""
+        declared = response.headers.get('Content-Length')
+        if declared and declared.isdigit() and int(declared) > max_bytes:
+            raise ValueError(f"Response too large ({declared} bytes)")
+
+        body = bytearray()
+        for chunk in response.iter_content(CHUNK_SIZE):
+            body += chunk
+            if len(body) > max_bytes:
+                raise ValueError(f"Response larger than {max_bytes} bytes")
+        return bytes(body)
+
+    def _get(self, url, headers, params=None, retries_metric=metrics.UPSTREAM_RETRIES):
+        """GET with retries on connection errors, timeouts and transient 5xx/429 responses"""
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.session.get(url, headers=headers, params=params,
+                                            timeout=self.timeout, stream=True)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.retries:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                    return response
+                response.close()
+            retries_metric.inc()
+            time.sleep(self._backoff_delay(attempt))
+
+    def _backoff_delay(self, attempt):
+        # "Full jitter": spreads retries from many sessions instead of retrying in lockstep
+        return random.uniform(0, self.backoff * (2 ** attempt))
+
+    def close(self):
+        self.session.close()
+
+
+# -------------------------------
+# Process-wide Default Client
+# -------------------------------
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_client():
+    """Return the client shared by every lookup in this process"""
+    global _default_client
+    if _default_client is None:
+        with _default_client_lock:
+            if _default_client is None:
+                _default_client = OpenFoodFactsClient()
+    return _default_client
@@ -0,0 +1,211 @@
+"""
+Columnar nutrient store for bulk jobs over the whole catalog
+
+    python -m nutriscan.columnar --store catalog.sqlite3
+
+Writes, from the local product store (see nutriscan.dump), one file holding the fields
+the health score reads as fixed-width float32 columns, with rows sorted by GTIN-14 so the
+barcode column doubles as the barcode -> row index. Apps and jobs open it with numpy.memmap:
+startup reads only the header, columns are paged in as they are used and shared between
+processes, and the vectorized scorer (see nutriscan.vectorized) runs straight over them.
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from array import array
+
+import numpy as np
+
+from nutriscan.openfoodfacts import normalize_product
+from nutriscan.records import NUTRIENT_COLUMNS
+from nutriscan.rules import ADDITIVES_COUNT, SCORING_PROFILE, load_profile
+from nutriscan.store import DEFAULT_STORE_PATH, ProductStore
+from nutriscan.vectorized import score_arrays
+
+# -------------------------------
+# Store Defaults
+# -------------------------------
+DEFAULT_COLUMNS_PATH = os.environ.get(
+    "NUTRISCAN_COLUMNS_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "nutriscan", "catalog.columns")
+)
+# Net ingredient quality indicator count (see ScoringProfile.quality_count), which depends
+# on the profile the store was built with
+INGREDIENT_QUALITY = 'ingredient_quality'
+COLUMNS = [column for column, _ in NUTRIENT_COLUMNS] + [ADDITIVES_COUNT, INGREDIENT_QUALITY]
+# Rows scored per pass by iter_scores, bounding the scorer's float64 temporaries
+CHUNK_ROWS = 1 << 20
+
+_MAGIC = b'NSCOLS01'
+_HEADER_SIZE = 4096  # Magic, then the JSON layout padded with spaces
+_ALIGN = 64
+_BARCODE_DTYPE = np.dtype('S14')
+_VALUE_DTYPE = np.dtype('<f4')
+
+
+def _aligned(offset):
+    return -(-offset // _ALIGN) * _ALIGN
+
+
+def _float(value):
+    # Missing or unparseable values are stored as NaN; the scorer counts them as 0
+    if value is None:
+        return math.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def _as_written(values):
+    """
+    float64 copy of float32 values, as close as possible to the values they were built from
+    A value with at most 6 significant digits (all float32 keeps) comes back exactly: 0.3,
+    not 0.30000001, so it falls in the same score band as in the scalar scorer. Others keep
+    their float32 value rather than being rounded onto a band breakpoint
+    """
+    wide = values.astype(np.float64)
+    nonzero = np.flatnonzero(np.isfinite(wide) & (wide != 0))
+    picked = wide[nonzero]
+    scale = 10.0 ** (5 - np.floor(np.log10(np.abs(picked))))
+    decimal = np.rint(picked * scale) / scale
+    wide[nonzero] = np.where(decimal.astype(np.float32) == values[nonzero], decimal, picked)
+    return wide
+
+
+# -------------------------------
+# Columnar Store
+# -------------------------------
+class ColumnarStore:
+    """
+    Read-only memory-mapped view of a columnar store file
+    barcodes is the sorted GTIN-14 column; column(name) returns a float32 memmap of len(self)
+    """
+
+    def __init__(self, path=DEFAULT_COLUMNS_PATH):
+        self.path = path
+        self._map = np.memmap(path, dtype=np.uint8, mode='r')
+        if bytes(self._map[:len(_MAGIC)]) != _MAGIC:
+            raise ValueError(f"{path} is not a nutriscan columnar store")
+        layout = json.loads(bytes(self._map[len(_MAGIC):_HEADER_SIZE]))
+        self.count = layout['count']
+        self.scoring_version = layout['scoring_version']
+        self.built_at = layout['built_at']
+        self.barcodes = self._view(layout['offsets']['barcode'], _BARCODE_DTYPE)
+        self._columns = {name: self._view(offset, _VALUE_DTYPE) for name, offset in layout['offsets'].items()
+                         if name != 'barcode'}
+
+    def _view(self, offset, dtype):
+        return self._map[offset:offset + self.count * dtype.itemsize].view(dtype)
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def columns(self):
+        return list(self._columns)
+
+    def column(self, name):
+        return self._columns[name]
+
+    def row(self, barcode):
+        """Row of a GTIN-14 barcode, or None if the store does not have it"""
+        key = barcode.encode('ascii')
+        i = int(np.searchsorted(self.barcodes, key))
+        return i if i < self.count and self.barcodes[i] == key else None
+
+    def score(self, profile=None, start=0, stop=None):
+        """
+        VectorScores (see nutriscan.vectorized) of rows start:stop, identical to the scalar
+        scorer's; profile must be the one the store was built with
+        """
+        profile = profile or SCORING_PROFILE
+        if profile.version != self.scoring_version:
+            raise ValueError(f"{self.path} was built with scoring profile {self.scoring_version!r}, "
+                             f"not {profile.version!r}; rebuild it with this profile")
+        rows = slice(start, stop)
+        columns = {rule.column: _as_written(self._columns[rule.column][rows]) for rule in profile.rules}
+        return score_arrays(columns, self._columns[INGREDIENT_QUALITY][rows].astype(np.int64), profile)
+
+    def iter_scores(self, profile=None, chunk_rows=CHUNK_ROWS):
+        """Yield (first row, VectorScores) over the whole store, chunk_rows rows at a time"""
+        for start in range(0, self.count, chunk_rows):
+            yield start, self.score(profile, start, start + chunk_rows)
+
+    def close(self):
+        # Views handed out keep the mapping alive until they are released
+        self._map = self.barcodes = self._columns = None
+
+
+def write_columnar(path, rows, scoring_version):
+    """
+    Write a columnar store from (GTIN-14 barcode, values in COLUMNS order) rows
+    The file is written next to path and swapped in, so readers never see a partial store
+    """
+    barcodes = bytearray()
+    values = [array('f') for _ in COLUMNS]
+    for barcode, row_values in rows:
+        barcodes += barcode.encode('ascii')
+        for column, value in zip(values, row_values):
+            column.append(value)
+
+    barcodes = np.frombuffer(bytes(barcodes), dtype=_BARCODE_DTYPE)
+    order = np.argsort(barcodes, kind='stable')
+    count = len(barcodes)
+    offsets = {'barcode': _HEADER_SIZE}
+    end = _HEADER_SIZE + count * _BARCODE_DTYPE.itemsize
+    for name in COLUMNS:
+        offsets[name] = _aligned(end)
+        end = offsets[name] + count * _VALUE_DTYPE.itemsize
+    layout = json.dumps({'count': count, 'scoring_version': scoring_version, 'built_at': time.time(),
+                         'offsets': offsets}).encode('utf-8')
+    if len(_MAGIC) + len(layout) > _HEADER_SIZE:
+        raise ValueError("Columnar store layout does not fit in the header")
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write((_MAGIC + layout).ljust(_HEADER_SIZE, b' '))
+        barcodes[order].tofile(f)
+        for name, column in zip(COLUMNS, values):
+            f.seek(offsets[name])
+            np.frombuffer(column, dtype=np.float32)[order].astype(_VALUE_DTYPE, copy=False).tofile(f)
+        f.truncate(end)
+    os.replace(tmp_path, path)
+    return count
+
+
+def iter_store_columns(store, profile=None):
+    """Yield write_columnar input for every product in the store; ingredient quality per profile"""
+    profile = profile or SCORING_PROFILE
+    columns = ['barcode'] + [column for column, _ in NUTRIENT_COLUMNS] + [ADDITIVES_COUNT, 'product']
+    for barcode, *values, document in store.iter_rows(columns):
+        ingredients = normalize_product(json.loads(document), barcode)['ingredients'] or ''
+        yield barcode, [_float(value) for value in values] + [profile.quality_count(ingredients.lower())]
+
+
+# -------------------------------
+# Command Line Interface
+# -------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the columnar nutrient store from the product store")
+    parser.add_argument('--store', default=DEFAULT_STORE_PATH, help=f"product store (default: {DEFAULT_STORE_PATH})")
+    parser.add_argument('-o', '--output', default=DEFAULT_COLUMNS_PATH, help=f"default: {DEFAULT_COLUMNS_PATH}")
+    parser.add_argument('--profile', help="scoring profile JSON (default: the active profile)")
+    args = parser.parse_args(argv)
+
+    profile = load_profile(args.profile) if args.profile else SCORING_PROFILE
+    store = ProductStore(args.store)
+    started = time.perf_counter()
+    count = write_columnar(args.output, iter_store_columns(store, profile), profile.version)
+    print(f"Wrote {count} products ({os.path.getsize(args.output) / 1024 / 1024:.1f} MB) in "
+          f"{time.perf_counter() - started:.1f}s -> {args.output}", file=sys.stderr)
+    store.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
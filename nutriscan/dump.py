@@ -0,0 +1,160 @@
+"""
+Offline scoring from the Open Food Facts bulk dump
+
+    python -m nutriscan.dump openfoodfacts-products.jsonl.gz --workers 8
+
+Both the JSONL dump and the tab-separated CSV export are supported, plain or gzipped.
+The dump is streamed line by line; chunks of lines are normalized and scored on a
+process pool and the results are written to the local product store (SQLite).
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from nutriscan.gtin import normalize_gtin
+from nutriscan.openfoodfacts import normalize_product
+from nutriscan.scoring import calculate_health_score
+from nutriscan.rules import load_profile
+from nutriscan.store import DEFAULT_STORE_PATH, NUTRIENT_COLUMNS, ProductStore, product_row
+
+
+# -------------------------------
+# Dump Reading
+# -------------------------------
+def is_csv_dump(path):
+    name = path[:-3] if path.endswith('.gz') else path
+    return name.endswith(('.csv', '.tsv'))
+
+
+def open_dump(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', errors='replace', newline='')
+    return open(path, encoding='utf-8', errors='replace', newline='')
+
+
+def iter_chunks(f, chunk_size):
+    """Group dump lines into lists of chunk_size so workers get coarse-grained tasks"""
+    chunk = []
+    for line in f:
+        chunk.append(line)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def csv_row_to_product(row):
+    """Rebuild the API's product document shape from one row of the CSV export"""
+    product = {
+        'code': row.get('code', ''),
+        'nutriments': {},
+        'additives_tags': [tag for tag in (row.get('additives_tags') or '').split(',') if tag],
+    }
+    # Empty CSV cells mean "missing", which the API expresses by leaving the field out
+    for field, column in [('product_name', 'product_name'), ('brands', 'brands'),
+                          ('categories', 'categories'), ('ingredients_text', 'ingredients_text'),
+                          ('image_url', 'image_url'), ('nutrition_grade_fr', 'nutriscore_grade')]:
+        if row.get(column):
+            product[field] = row[column]
+    for _, key in NUTRIENT_COLUMNS:
+        try:
+            product['nutriments'][key] = float(row[key])
+        except (KeyError, TypeError, ValueError):
+            pass
+    return product
+
+
+def score_chunk(lines, header=None, profile=None):
+    """
+    Parse, normalize and score a chunk of dump lines (runs in a worker process)
+    Returns (store rows, number of records that could not be scored)
+    """
+    rows = []
+    errors = 0
+    for line in lines:
+        try:
+            if header is None:
+                product = json.loads(line)
+            else:
+                product = csv_row_to_product(dict(zip(header, line.rstrip('\r\n').split('\t'))))
+            # Codes that are not valid GTINs could never be looked up by the app
+            barcode = normalize_gtin(str(product.get('code', '')))
+            health_score, _, _ = calculate_health_score(normalize_product(product, barcode), profile)
+            rows.append(product_row(barcode, product, health_score))
+        except Exception:
+            errors += 1
+    return rows, errors
+
+
+# -------------------------------
+# Ingest Driver
+# -------------------------------
+def ingest_dump(path, store, workers=None, chunk_size=500, progress=None, profile=None):
+    """
+    Stream a dump into the product store using a process pool
+    At most 2 * workers chunks are in flight, so memory stays bounded for multi-GB dumps
+    Returns (records stored, records skipped)
+    """
+    workers = workers or os.cpu_count() or 1
+    stored = skipped = 0
+
+    def collect(done):
+        nonlocal stored, skipped
+        for future in done:
+            rows, errors = future.result()
+            store.upsert_many(rows)
+            stored += len(rows)
+            skipped += errors
+        if progress:
+            progress(stored, skipped)
+
+    with open_dump(path) as f, ProcessPoolExecutor(max_workers=workers) as executor:
+        header = f.readline().rstrip('\r\n').split('\t') if is_csv_dump(path) else None
+        pending = set()
+        for chunk in iter_chunks(f, chunk_size):
+            pending.add(executor.submit(score_chunk, chunk, header, profile))
+            if len(pending) >= workers * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+        collect(pending)
+    return stored, skipped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score an Open Food Facts dump into the local product store")
+    parser.add_argument('dump', help="JSONL or CSV dump, optionally .gz")
+    parser.add_argument('--store', default=DEFAULT_STORE_PATH, help=f"SQLite store (default: {DEFAULT_STORE_PATH})")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument('--chunk-size', type=int, default=500, help="dump lines per worker task (default: 500)")
+    parser.add_argument('--profile', help="scoring profile JSON (default: the built-in profile)")
+    args = parser.parse_args(argv)
+
+    profile = load_profile(args.profile) if args.profile else None
+    store = ProductStore(args.store)
+    started = time.perf_counter()
+    last_report = [started]
+
+    def progress(stored, skipped):
+        now = time.perf_counter()
+        if now - last_report[0] >= 10:
+            last_report[0] = now
+            print(f"{stored} stored, {skipped} skipped, {stored / (now - started):.0f} records/s", file=sys.stderr)
+
+    stored, skipped = ingest_dump(args.dump, store, args.workers, args.chunk_size, progress, profile)
+    elapsed = time.perf_counter() - started
+    print(
+        f"Stored {stored} products ({skipped} skipped) in {elapsed:.1f}s "
+        f"({stored / elapsed if elapsed else 0:.0f} records/s) -> {args.store}",
+        file=sys.stderr
+    )
+    store.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""
+Coalescing product fetcher shared by all app sessions
+
+Lookups run on one asyncio event loop in a background thread. Concurrent lookups of the
+same barcode share a single in-flight upstream call (single-flight), and a global
+semaphore caps how many upstream calls run at once, however many sessions are scanning.
+"""
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from nutriscan import metrics
+from nutriscan.gtin import InvalidBarcode, normalize_gtin
+from nutriscan.openfoodfacts import get_product_info_openfoodfacts
+
+# -------------------------------
+# Fetcher Defaults
+# -------------------------------
+DEFAULT_MAX_CONCURRENCY = int(os.environ.get("NUTRISCAN_UPSTREAM_CONCURRENCY", "8"))
+
+
+class ProductFetcher:
+    """
+    Thread-safe front end to get_product_info_openfoodfacts
+    fetch() can be called from any thread (e.g. Streamlit script threads) and returns a
+    concurrent.futures.Future; all coordination happens on the fetcher's own event loop
+    """
+
+    def __init__(self, cache=None, client=None, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        self.cache = cache
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self.upstream_calls = 0  # Lookups that went past the cache to the API
+        self.coalesced = 0       # Lookups that joined another lookup's in-flight call
+        # The blocking HTTP client runs on these threads, at most max_concurrency at a time
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='nutriscan-fetch')
+        self._in_flight = {}     # GTIN-14 -> asyncio.Task; only touched on the loop thread
+        self._loop = asyncio.new_event_loop()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._thread = threading.Thread(target=self._loop.run_forever, name='nutriscan-fetcher', daemon=True)
+        self._thread.start()
+
+    def fetch(self, barcode):
+        """Look up a barcode; returns a Future resolving to the product_info dict"""
+        return asyncio.run_coroutine_threadsafe(self.lookup(barcode), self._loop)
+
+    async def lookup(self, barcode):
+        """Coroutine form of fetch(), for callers already running on the fetcher's loop"""
+        try:
+            gtin = normalize_gtin(barcode)
+        except InvalidBarcode:
+            # Answered locally in microseconds; nothing to coalesce or cache
+            return get_product_info_openfoodfacts(barcode)
+        task = self._in_flight.get(gtin)
+        if task is None:
+            task = self._loop.create_task(self._lookup(barcode, gtin))
+            self._in_flight[gtin] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(gtin, None))
+        else:
+            self.coalesced += 1
+            metrics.FETCH_COALESCED.inc()
+        # shield: one caller giving up must not cancel the call the others are waiting on
+        return await asyncio.shield(task)
+
+    async def _lookup(self, barcode, gtin):
+        # Fresh cache hits are answered without taking an upstream slot
+        if self.cache is not None:
+            entry = self.cache.get_entry(gtin)
+            if entry is not None and entry.fresh:
+                metrics.CACHE_LOOKUPS.inc(result='hit')
+                return entry.product_info
+
+        async with self._semaphore:
+            self.upstream_calls += 1
+            # Run in the caller's context so its metrics trace sees the upstream stages
+            context = contextvars.copy_context()
+            return await self._loop.run_in_executor(
+                self._executor, context.run, get_product_info_openfoodfacts, barcode, self.cache, self.client
+            )
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._executor.shutdown(wait=False)
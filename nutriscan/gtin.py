@@ -0,0 +1,64 @@
+"""
+GTIN barcodes: check digit validation and canonical keys
+
+A product can be entered as GTIN-8 (EAN-8), GTIN-12 (UPC-A), GTIN-13 (EAN-13) or GTIN-14;
+left-padded with zeros to 14 digits they are the same number. normalize_gtin() returns that
+GTIN-14 form, which every cache, store and index uses as the product key, and rejects
+codes with a wrong length or check digit before any lookup is made.
+"""
+GTIN_LENGTHS = (8, 12, 13, 14)
+_DIGITS = frozenset('0123456789')
+
+
+class InvalidBarcode(ValueError):
+    """The input is not a well-formed GTIN; the message says why"""
+
+
+def check_digit(digits):
+    """GS1 check digit for a string of digits without its check digit"""
+    # Weights alternate 3, 1, 3, ... starting from the digit next to the check digit
+    total = 0
+    weight = 3
+    for digit in reversed(digits):
+        total += (ord(digit) - 48) * weight
+        weight = 4 - weight
+    return (10 - total % 10) % 10
+
+
+def normalize_gtin(barcode):
+    """
+    Canonical GTIN-14 of a barcode; spaces and dashes are ignored
+    Raises InvalidBarcode for other characters, unsupported lengths or a wrong check digit
+    """
+    digits = barcode.strip().replace(' ', '').replace('-', '')
+    if not digits:
+        raise InvalidBarcode("Please enter a barcode")
+    if not _DIGITS.issuperset(digits):
+        raise InvalidBarcode("A barcode may only contain digits")
+    if len(digits) not in GTIN_LENGTHS:
+        raise InvalidBarcode(f"A barcode has 8, 12, 13 or 14 digits, not {len(digits)}")
+    expected = check_digit(digits[:-1])
+    if ord(digits[-1]) - 48 != expected:
+        raise InvalidBarcode(f"Check digit mismatch (the last digit should be {expected}); "
+                             "please check the barcode for typos")
+    return digits.rjust(14, '0')
+
+
+def is_valid_gtin(barcode):
+    try:
+        normalize_gtin(barcode)
+        return True
+    except InvalidBarcode:
+        return False
+
+
+def short_code(gtin):
+    """
+    Shortest usual form of a GTIN-14: EAN-8, EAN-13 or GTIN-14
+    This is the form Open Food Facts files products under, and the one shown to users
+    """
+    if gtin.startswith('000000'):
+        return gtin[6:]
+    if gtin.startswith('0'):
+        return gtin[1:]
+    return gtin
@@ -0,0 +1,141 @@
+"""Persistent scan history: compact summary rows per owner, queried one page at a time"""
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+# -------------------------------
+# History Defaults
+# -------------------------------
+DEFAULT_HISTORY_PATH = os.environ.get(
+    "NUTRISCAN_HISTORY_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "nutriscan", "history.sqlite3")
+)
+DEFAULT_RETENTION = int(os.environ.get("NUTRISCAN_HISTORY_RETENTION", "500"))  # Scans kept per owner
+# Owners with no scan for this long are deleted, so histories of one-off visitors do not pile up
+DEFAULT_MAX_AGE = float(os.environ.get("NUTRISCAN_HISTORY_MAX_AGE_DAYS", "90")) * 24 * 3600
+EXPIRE_INTERVAL = 3600  # Seconds between sweeps for inactive owners
+DEFAULT_PAGE_SIZE = 20
+
+# The full product is not copied into history; barcode is the key into the product cache
+HistoryItem = namedtuple('HistoryItem', ['barcode', 'name', 'brand', 'score', 'scanned_at'])
+# total is the number of items matching the filters, across all pages
+HistoryPage = namedtuple('HistoryPage', ['items', 'total', 'page', 'page_size'])
+
+
+class HistoryStore:
+    """
+    SQLite-backed scan history keyed on an owner id (one per user / browser)
+    Only the newest `retention` scans of each owner are kept, and owners without a scan in
+    the last max_age seconds are deleted (max_age None keeps them forever)
+    """
+
+    def __init__(self, path=DEFAULT_HISTORY_PATH, retention=DEFAULT_RETENTION, max_age=DEFAULT_MAX_AGE):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.retention = retention
+        self.max_age = max_age
+        self._expired_at = 0.0
+        self._lock = threading.Lock()
+        # Streamlit serves each session from its own thread, so share one connection behind a lock
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS scans (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                owner TEXT NOT NULL,
+                barcode TEXT NOT NULL,
+                name TEXT,
+                brand TEXT,
+                score INTEGER,
+                scanned_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_scans_owner ON scans (owner, scanned_at)")
+
+    def add(self, owner, barcode, name, brand, score, scanned_at=None):
+        """Record a scan, dropping the owner's oldest scans past the retention cap"""
+        if self.max_age and time.time() - self._expired_at >= EXPIRE_INTERVAL:
+            self.expire_inactive()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO scans (owner, barcode, name, brand, score, scanned_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (owner, barcode, name, brand, score, time.time() if scanned_at is None else scanned_at)
+            )
+            self._conn.execute(
+                "DELETE FROM scans WHERE owner = ? AND id NOT IN "
+                "(SELECT id FROM scans WHERE owner = ? ORDER BY scanned_at DESC, id DESC LIMIT ?)",
+                (owner, owner, self.retention)
+            )
+
+    @staticmethod
+    def _filters(owner, search, brand, min_score, max_score, since, until):
+        clauses = ["owner = ?"]
+        params = [owner]
+        if search:
+            clauses.append("(name LIKE ? OR brand LIKE ? OR barcode LIKE ?)")
+            pattern = f"%{search}%"
+            params += [pattern, pattern, pattern]
+        if brand:
+            clauses.append("brand = ?")
+            params.append(brand)
+        if min_score is not None:
+            clauses.append("score >= ?")
+            params.append(min_score)
+        if max_score is not None:
+            clauses.append("score <= ?")
+            params.append(max_score)
+        if since is not None:
+            clauses.append("scanned_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("scanned_at < ?")
+            params.append(until)
+        return ' AND '.join(clauses), params
+
+    def page(self, owner, page=0, page_size=DEFAULT_PAGE_SIZE, search=None, brand=None,
+             min_score=None, max_score=None, since=None, until=None):
+        """Return one HistoryPage of an owner's scans, newest first, matching the filters"""
+        where, params = self._filters(owner, search, brand, min_score, max_score, since, until)
+        with self._lock:
+            (total,) = self._conn.execute(f"SELECT COUNT(*) FROM scans WHERE {where}", params).fetchone()
+            rows = self._conn.execute(
+                f"SELECT barcode, name, brand, score, scanned_at FROM scans WHERE {where} "
+                "ORDER BY scanned_at DESC, id DESC LIMIT ? OFFSET ?",
+                params + [page_size, page * page_size]
+            ).fetchall()
+        return HistoryPage([HistoryItem(*row) for row in rows], total, page, page_size)
+
+    def brands(self, owner):
+        """Distinct brands in an owner's history, for the brand filter"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT brand FROM scans WHERE owner = ? AND brand IS NOT NULL ORDER BY brand",
+                (owner,)
+            ).fetchall()
+        return [brand for (brand,) in rows]
+
+    def expire_inactive(self, now=None):
+        """Delete the history of every owner whose latest scan is older than max_age; returns scans deleted"""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._expired_at = now
+            if not self.max_age:
+                return 0
+            return self._conn.execute(
+                "DELETE FROM scans WHERE owner IN "
+                "(SELECT owner FROM scans GROUP BY owner HAVING MAX(scanned_at) < ?)",
+                (now - self.max_age,)
+            ).rowcount
+
+    def clear(self, owner):
+        with self._lock:
+            self._conn.execute("DELETE FROM scans WHERE owner = ?", (owner,))
+
+    def count(self, owner, search=None, brand=None, min_score=None, max_score=None, since=None, until=None):
+        """Number of an owner's scans matching the filters"""
+        where, params = self._filters(owner, search, brand, min_score, max_score, since, until)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM scans WHERE {where}", params).fetchone()[0]
@@ -0,0 +1,198 @@
+"""
+Local product image cache: WebP thumbnails of Open Food Facts images
+
+Each image is downloaded once, resized to THUMBNAIL_SIZES and re-encoded as WebP into a
+directory capped at max_bytes (least recently used files are evicted first). The app shows
+the local files instead of hot-linking the full-size original from the CDN, and prefetch()
+warms the cache in the background, e.g. for products scored by nutriscan.batch. Images that
+failed to download are not retried for FAILURE_TTL seconds.
+"""
+import hashlib
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from PIL import Image, ImageOps
+
+from nutriscan import metrics
+
+# -------------------------------
+# Image Cache Defaults
+# -------------------------------
+DEFAULT_IMAGE_DIR = os.environ.get(
+    "NUTRISCAN_IMAGE_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "nutriscan", "images")
+)
+DEFAULT_MAX_BYTES = int(os.environ.get("NUTRISCAN_IMAGE_CACHE_MB", "200")) * 1024 * 1024
+DISPLAY_SIZE = 400
+# Widths (px) kept per image: the Overview tab picture
+THUMBNAIL_SIZES = (DISPLAY_SIZE,)
+WEBP_QUALITY = 80
+MAX_IMAGE_BYTES = 10 * 1024 * 1024
+PREFETCH_WORKERS = 4
+# Seconds a failed download is remembered, so pages showing the image do not retry it
+FAILURE_TTL = 300
+MAX_FAILURES = 10000
+
+IMAGE_REQUESTS = metrics.Counter(
+    'nutriscan_image_requests_total', "Product image requests by result (hit, miss, error, failed_recently)", labels=('result',)
+)
+metrics.METRICS.append(IMAGE_REQUESTS)
+
+
+class ImageCache:
+    """
+    Directory of <sha1 of url>-<width>.webp files; a file's mtime is its last use
+    Safe to share between threads; concurrent requests for one image share its download
+    """
+
+    def __init__(self, directory=DEFAULT_IMAGE_DIR, max_bytes=DEFAULT_MAX_BYTES, client=None,
+                 sizes=THUMBNAIL_SIZES):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.client = client
+        self.sizes = sizes
+        self._lock = threading.Lock()
+        self._in_flight = {}  # key -> lock held by the thread downloading it
+        self._failed = OrderedDict()  # key -> time of its last failed download, oldest first
+        self._bytes = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+        self._executor = None
+
+    def _path(self, key, size):
+        return os.path.join(self.directory, f"{key}-{size}.webp")
+
+    def get(self, url, size=DISPLAY_SIZE):
+        """Path of the cached thumbnail of url, downloading it if needed; None if that fails"""
+        if not url:
+            return None
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        path = self._path(key, size)
+        if self._touch(path):
+            IMAGE_REQUESTS.inc(result='hit')
+            return path
+
+        with self._lock:
+            lock = self._in_flight.setdefault(key, threading.Lock())
+        with lock:
+            try:
+                # Another thread may have stored it, or failed to, while this one waited
+                if self._touch(path):
+                    IMAGE_REQUESTS.inc(result='hit')
+                    return path
+                if self._failed_recently(key):
+                    IMAGE_REQUESTS.inc(result='failed_recently')
+                    return None
+                with metrics.timed('image'):
+                    self._store(key, self._download(url))
+                IMAGE_REQUESTS.inc(result='miss')
+                return path
+            except Exception:
+                IMAGE_REQUESTS.inc(result='error')
+                self._remember_failure(key)
+                return None
+            finally:
+                with self._lock:
+                    self._in_flight.pop(key, None)
+
+    def cached(self, url, timeout, size=DISPLAY_SIZE):
+        """
+        Path of the cached thumbnail of url if it is ready within timeout seconds, else None
+        Never downloads on the calling thread: a missing image is fetched in the background
+        (or its prefetch is waited for) and shows up on a later call
+        """
+        if not url:
+            return None
+        path = self._path(hashlib.sha1(url.encode('utf-8')).hexdigest(), size)
+        if self._touch(path):
+            IMAGE_REQUESTS.inc(result='hit')
+            return path
+        future = self.prefetch([url])[0]
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            return None
+
+    def prefetch(self, urls):
+        """Download images in the background; returns the futures (resolving to paths)"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix='nutriscan-image')
+        return [self._executor.submit(self.get, url) for url in urls if url]
+
+    def close(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+
+    def _failed_recently(self, key):
+        with self._lock:
+            failed_at = self._failed.get(key)
+            return failed_at is not None and time.monotonic() - failed_at < FAILURE_TTL
+
+    def _remember_failure(self, key):
+        now = time.monotonic()
+        with self._lock:
+            self._failed[key] = now
+            self._failed.move_to_end(key)
+            while self._failed:
+                oldest, failed_at = next(iter(self._failed.items()))
+                if now - failed_at < FAILURE_TTL and len(self._failed) <= MAX_FAILURES:
+                    break
+                del self._failed[oldest]
+
+    @staticmethod
+    def _touch(path):
+        try:
+            os.utime(path)
+            return True
+        except OSError:
+            return False
+
+    def _download(self, url):
+        if self.client is None:
+            # The product API client's pooled session also keeps connections to the image CDN
+            from nutriscan.client import get_default_client
+            self.client = get_default_client()
+        return self.client.get_bytes(url, MAX_IMAGE_BYTES)
+
+    def _store(self, key, data):
+        with Image.open(io.BytesIO(data)) as image:
+            image = ImageOps.exif_transpose(image)
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+            added = 0
+            for size in self.sizes:
+                thumbnail = image.copy()
+                thumbnail.thumbnail((size, size * 4))  # Width-bound; tall packs keep their shape
+                path = self._path(key, size)
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                thumbnail.save(tmp_path, 'WEBP', quality=WEBP_QUALITY, method=4)
+                os.replace(tmp_path, path)
+                added += os.path.getsize(path)
+        with self._lock:
+            self._bytes += added
+            over = self._bytes > self.max_bytes
+        if over:
+            self._evict()
+
+    def _evict(self):
+        """Delete least recently used files until the cache is back to 90% of max_bytes"""
+        with self._lock:
+            files = []
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith('.webp'):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+            files.sort()
+            total = sum(size for _, size, _ in files)
+            for _, size, path in files:
+                if total <= self.max_bytes * 0.9:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:  # Already evicted by another process sharing the directory
+                    pass
+            self._bytes = total
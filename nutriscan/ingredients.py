@@ -0,0 +1,131 @@
+"""Ingredient list extraction and ingredients text parsing"""
+import re
+from collections import namedtuple
+
+# -------------------------------
+# Ingredients Text Tokenizer
+# -------------------------------
+# percent is a float (e.g. 12.5 for "12.5%") or None; sub_ingredients is a tuple of Ingredient
+Ingredient = namedtuple('Ingredient', ['name', 'percent', 'sub_ingredients'])
+
+# One split finds both delimiters and quantities: re.split yields, per match, the delimiter
+# (or None) and the percentage value (or None), i.e. [text, delim, value, text, ...]
+# Quantities are percentages and amounts such as "12%", "12,5 %", "2.5 g" or "40"; digits
+# glued to letters (E-numbers like "e330", "vitamin b12") are part of the name and kept. A
+# comma inside a number ("12,5%") is a decimal comma, not a separator
+# The lookahead lets the regex engine skip straight to the next digit or delimiter
+_TOKENS = re.compile(
+    r'(?=[\d,;()\[\]{}])(?:([,;()\[\]{}])'
+    r'|(?<!\w)(?:(\d+(?:[.,]\d+)?)\s*%|\d+(?:[.,]\d+)?\s*(?:(?:mg|g|kg|ml|cl|l)\b)?))',
+    re.IGNORECASE
+)
+_OPENERS = '([{'
+_STRIP_CHARS = ' \t\r\n.:*_-'
+
+
+def _build(raw, percent, subs):
+    """Turn a raw (text without quantities, percent, sub items) item into an Ingredient"""
+    name = ' '.join(raw.split()).strip(_STRIP_CHARS)
+    if not subs:
+        return Ingredient(name, percent, ())
+
+    sub_ingredients = []
+    for sub in subs:
+        ingredient = _build(*sub)
+        if ingredient.name:
+            sub_ingredients.append(ingredient)
+        else:
+            # A bracket holding only an annotation, e.g. "sugar (12%)"
+            if percent is None:
+                percent = ingredient.percent
+            sub_ingredients.extend(ingredient.sub_ingredients)
+    return Ingredient(name, percent, tuple(sub_ingredients))
+
+
+def parse_ingredients(text):
+    """
+    Parse an ingredients text into a list of Ingredient tokens in one pass over its delimiters
+    Commas/semicolons separate ingredients; (), [] and {} open a nested sub-ingredient list
+    on the preceding ingredient. Unbalanced brackets are tolerated.
+    """
+    tokens = _TOKENS.split(text)
+    # The ingredient being read (its text, first percentage and sub items) and the finished
+    # ones at the current depth; stack saves them for each enclosing bracket
+    items, raw, percent, subs = [], tokens[0], None, []
+    stack = []
+
+    for i in range(1, len(tokens), 3):
+        delimiter, value, segment = tokens[i], tokens[i + 1], tokens[i + 2]
+        if delimiter is None:  # A quantity: dropped from the name, its percentage kept
+            if value is not None and percent is None:
+                percent = float(value.replace(',', '.'))
+            raw += segment
+        elif delimiter in _OPENERS:
+            stack.append((items, raw, percent, subs))
+            items, raw, percent, subs = [], segment, None, []
+        elif delimiter == ',' or delimiter == ';':
+            if subs or percent is not None or raw.strip():
+                items.append((raw, percent, subs))
+            raw, percent, subs = segment, None, []
+        elif stack:
+            if subs or percent is not None or raw.strip():
+                items.append((raw, percent, subs))
+            inner = items
+            items, raw, percent, subs = stack.pop()
+            subs.extend(inner)
+            raw += segment
+        else:  # Stray closing bracket
+            raw += segment
+
+    if subs or percent is not None or raw.strip():
+        items.append((raw, percent, subs))
+    while stack:  # Close brackets left open
+        inner = items
+        items, raw, percent, subs = stack.pop()
+        subs.extend(inner)
+        if subs or percent is not None or raw.strip():
+            items.append((raw, percent, subs))
+
+    return [_build(*item) for item in items]
+
+
+# -------------------------------
+# Ingredients Extraction Function
+# -------------------------------
+def _text_ingredient_names(ingredients_text):
+    # Top-level ingredients only; bracketed sub-ingredients and percentages are dropped from the names
+    return [
+        ingredient.name for ingredient in parse_ingredients(ingredients_text)
+        if len(ingredient.name) > 2  # Filter out very short strings
+    ]
+
+
+def extract_ingredients_list(product_info):
+    """
+    Extract and format the list of ingredients used in the product
+    Returns a list of ingredient names
+    """
+    ingredients = []
+
+    # Try to get from ingredients_list (structured data)
+    if product_info.get('ingredients_list'):
+        for ingredient in product_info['ingredients_list']:
+            if isinstance(ingredient, dict) and 'text' in ingredient:
+                ingredients.append(ingredient['text'])
+            elif isinstance(ingredient, str):
+                ingredients.append(ingredient)
+
+    # If no structured data, parse ingredients_text
+    if not ingredients and product_info.get('ingredients'):
+        ingredients = _text_ingredient_names(product_info['ingredients'])
+
+    return ingredients
+
+
+def ingredient_names(product):
+    """Same as extract_ingredients_list, for a Product record"""
+    if product.ingredients_list:
+        return list(product.ingredients_list)
+    if product.ingredients:
+        return _text_ingredient_names(product.ingredients)
+    return []
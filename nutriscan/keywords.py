@@ -0,0 +1,82 @@
+"""
+Single-pass multi-keyword matching for ingredient classification
+
+Keyword groups (e.g. the Ingredients tab's positive/negative lists) are compiled into one
+regex alternation. One scan over a whole ingredient list classifies every ingredient,
+instead of one substring search per keyword per ingredient, repeated per pass.
+"""
+import re
+from bisect import bisect_right
+
+# Separator used to scan a whole ingredient list at once; never part of a keyword
+_SEPARATOR = '\n'
+
+
+def _straddles(match, keyword):
+    """Whether keyword can start inside match and run past its end"""
+    return any(keyword.startswith(match[i:]) for i in range(1, len(match)))
+
+
+class KeywordMatcher:
+    """
+    Finds which keywords of a fixed set occur in lowercased text
+    Results are the same as testing `keyword in text` for every keyword: the regex reports
+    non-overlapping matches, so keywords hidden by a match are recovered from tables
+    precomputed here (keywords inside the match, and keywords straddling its end)
+    """
+
+    def __init__(self, groups):
+        self.bits = {name: 1 << i for i, name in enumerate(groups)}
+        self.keyword_bits = {}
+        for name, keywords in groups.items():
+            for keyword in keywords:
+                keyword = keyword.lower()
+                self.keyword_bits[keyword] = self.keyword_bits.get(keyword, 0) | self.bits[name]
+
+        keywords = sorted(self.keyword_bits, key=len, reverse=True)  # Longest alternative wins
+        self._pattern = re.compile('|'.join(re.escape(keyword) for keyword in keywords))
+        self._contained = {
+            match: tuple(k for k in keywords if k != match and k in match) for match in keywords
+        }
+        self._straddling = {
+            match: tuple(k for k in keywords if k not in match and _straddles(match, k)) for match in keywords
+        }
+        # Group bits of a match including every keyword it contains
+        self._match_bits = {match: self._bits_of((match,) + self._contained[match]) for match in keywords}
+
+    def _bits_of(self, keywords):
+        bits = 0
+        for keyword in keywords:
+            bits |= self.keyword_bits[keyword]
+        return bits
+
+    def find(self, text):
+        """Return the set of distinct keywords occurring in text"""
+        found = set()
+        for match in set(self._pattern.findall(text)):
+            found.add(match)
+            found.update(self._contained[match])
+            found.update(k for k in self._straddling[match] if k in text)
+        return found
+
+    def classify(self, texts):
+        """
+        Group bitmask for each text of a list (e.g. one per ingredient), in a single scan
+        over the lowercased texts joined together
+        """
+        lowered = [text.lower() for text in texts]
+        starts = []
+        offset = 0
+        for text in lowered:
+            starts.append(offset)
+            offset += len(text) + len(_SEPARATOR)
+
+        masks = [0] * len(lowered)
+        for match in self._pattern.finditer(_SEPARATOR.join(lowered)):
+            keyword = match.group()
+            i = bisect_right(starts, match.start()) - 1
+            masks[i] |= self._match_bits[keyword]
+            for k in self._straddling[keyword]:
+                if k in lowered[i]:
+                    masks[i] |= self.keyword_bits[k]
+        return masks
@@ -0,0 +1,234 @@
+"""
+Pipeline instrumentation: Prometheus-style counters and histograms, per-scan traces
+
+    with timed('score'):
+        ...
+
+records the stage duration in the nutriscan_stage_seconds histogram, in the current trace
+(if one is active, see trace()) and, when NUTRISCAN_OTEL is set and opentelemetry is
+installed, as an OpenTelemetry span. Metrics are exposed in the Prometheus text format by
+render_prometheus() or start_http_server(port).
+"""
+import contextvars
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # Optional dependency
+    otel_trace = None
+
+# -------------------------------
+# Metric Types
+# -------------------------------
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_text(names, values):
+    return ','.join(f'{name}="{value}"' for name, value in zip(names, values))
+
+
+class Counter:
+    """Monotonic counter with a fixed set of label names"""
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels[name] for name in self.labels), 0)
+
+    def total(self):
+        return sum(self._values.values())
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                labels = _label_text(self.labels, key)
+                lines.append(f"{self.name}{{{labels}}} {value}" if labels else f"{self.name} {value}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with a fixed set of label names"""
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                labels = _label_text(self.labels, key)
+                prefix = labels + ',' if labels else ''
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                    cumulative += bucket_count
+                    lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+                suffix = f"{{{labels}}}" if labels else ''
+                lines.append(f"{self.name}_sum{suffix} {total}")
+                lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+
+# -------------------------------
+# NutriScan Metrics
+# -------------------------------
+STAGE_SECONDS = Histogram(
+    'nutriscan_stage_seconds', "Time spent in each scan pipeline stage", labels=('stage',)
+)
+CACHE_LOOKUPS = Counter(
+    'nutriscan_cache_lookups_total', "Product cache lookups by result (hit, stale, miss)", labels=('result',)
+)
+UPSTREAM_REQUESTS = Counter(
+    'nutriscan_upstream_requests_total',
+    "Open Food Facts API lookups by outcome (found, not_found, not_modified, error)", labels=('outcome',)
+)
+UPSTREAM_RETRIES = Counter('nutriscan_upstream_retries_total', "Open Food Facts API requests retried")
+DOWNLOAD_RETRIES = Counter(
+    'nutriscan_download_retries_total', "Other downloads through the API client (product images) retried"
+)
+FETCH_COALESCED = Counter(
+    'nutriscan_fetch_coalesced_total', "Lookups that joined another session's in-flight API call"
+)
+BLOOM_CHECKS = Counter(
+    'nutriscan_bloom_checks_total',
+    "Known-barcode filter checks by result (absent: answered locally, maybe: looked up)", labels=('result',)
+)
+BLOOM_FALSE_POSITIVES = Counter(
+    'nutriscan_bloom_false_positives_total', "Barcodes the filter let through that the API did not know"
+)
+METRICS = [STAGE_SECONDS, CACHE_LOOKUPS, UPSTREAM_REQUESTS, UPSTREAM_RETRIES, DOWNLOAD_RETRIES,
+           FETCH_COALESCED, BLOOM_CHECKS, BLOOM_FALSE_POSITIVES]
+
+
+def cache_hit_ratio():
+    """Fresh cache hits over all cache lookups, or None before the first lookup"""
+    total = CACHE_LOOKUPS.total()
+    return CACHE_LOOKUPS.value(result='hit') / total if total else None
+
+
+def upstream_error_rate():
+    """Failed API lookups over all API lookups, or None before the first one"""
+    total = UPSTREAM_REQUESTS.total()
+    return UPSTREAM_REQUESTS.value(outcome='error') / total if total else None
+
+
+def bloom_false_positive_rate():
+    """Share of filter pass-throughs the API did not know, or None before the first one"""
+    passed = BLOOM_CHECKS.value(result='maybe')
+    return BLOOM_FALSE_POSITIVES.total() / passed if passed else None
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+# -------------------------------
+# Stage Timing and Traces
+# -------------------------------
+# Timings of the scan being handled in the current context (None when not tracing)
+_current_trace = contextvars.ContextVar('nutriscan_trace', default=None)
+_tracer = otel_trace.get_tracer('nutriscan') if otel_trace and os.environ.get("NUTRISCAN_OTEL") else None
+
+
+class Trace:
+    """Stage durations (seconds) recorded while this trace was active, in first-seen order"""
+
+    def __init__(self):
+        self.timings = OrderedDict()
+
+    def add(self, stage, seconds):
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def trace():
+    """
+    Collect the stage timings of everything run in this context into a new Trace
+    Context variables follow ProductFetcher lookups onto its event loop and worker threads
+    """
+    current = Trace()
+    token = _current_trace.set(current)
+    try:
+        yield current
+    finally:
+        _current_trace.reset(token)
+
+
+def observe(stage, seconds):
+    """Record a stage duration measured elsewhere"""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    current = _current_trace.get()
+    if current is not None:
+        current.add(stage, seconds)
+
+
+@contextmanager
+def timed(stage):
+    """Time the enclosed block as one stage"""
+    with _tracer.start_as_current_span(f"nutriscan.{stage}") if _tracer else nullcontext():
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            observe(stage, time.perf_counter() - started)
+
+
+# -------------------------------
+# Prometheus Endpoint
+# -------------------------------
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        body = render_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_http_server(port, host='0.0.0.0'):
+    """Serve render_prometheus() on http://host:port/ from a daemon thread"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='nutriscan-metrics', daemon=True).start()
+    return server
@@ -0,0 +1,258 @@
+"""
+Local mirror of the Open Food Facts product API, shared by app replicas
+
+    python -m nutriscan.mirror --store catalog.sqlite3 --port 8100
+    NUTRISCAN_OFF_BASE_URL=http://localhost:8100 streamlit run main.py
+
+Serves /api/v0/product/<barcode>.json from the local product store (populated with
+python -m nutriscan.dump). Barcodes missing from the store are fetched from the public API
+once, added to the store and served from it afterwards (read-through); --offline serves
+the store only. Responses carry an ETag so app caches revalidate with 304 Not Modified.
+"""
+import argparse
+import hashlib
+import json
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from nutriscan import metrics
+from nutriscan.client import OFF_PUBLIC_URL, OpenFoodFactsClient
+from nutriscan.gtin import InvalidBarcode, normalize_gtin, short_code
+from nutriscan.openfoodfacts import normalize_product
+from nutriscan.rules import load_profile
+from nutriscan.scoring import calculate_health_score
+from nutriscan.store import DEFAULT_STORE_PATH, ProductStore, product_row
+
+# -------------------------------
+# Mirror Defaults
+# -------------------------------
+DEFAULT_PORT = 8100
+# Barcodes upstream did not know are not asked for again for this long (seconds)
+NOT_FOUND_TTL = 6 * 60 * 60
+# Unknown barcodes remembered at most; the oldest are forgotten first
+NOT_FOUND_MAX_ENTRIES = 100000
+
+_PRODUCT_PATH = re.compile(r'/api/v0/product/(\d+)\.json$')
+
+MIRROR_REQUESTS = metrics.Counter(
+    'nutriscan_mirror_requests_total',
+    "Mirror product requests by result (hit, read_through, not_found, error)", labels=('result',)
+)
+metrics.METRICS.append(MIRROR_REQUESTS)
+
+
+class _Fetch:
+    """One barcode's upstream fetch: the lock its fetching thread holds, and its outcome"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.users = 0        # Threads fetching or waiting; the entry is dropped at 0
+        self.outcome = None   # (product, result label) once fetched
+        self.error = None     # Or the exception it raised
+
+
+class ProductMirror:
+    """
+    Product lookups against the store, falling back to the upstream API on a miss
+    Concurrent misses of one barcode share a single upstream call and its outcome
+    """
+
+    def __init__(self, store, client=None, profile=None, not_found_ttl=NOT_FOUND_TTL,
+                 not_found_max_entries=NOT_FOUND_MAX_ENTRIES):
+        self.store = store
+        self.client = client  # None: store only
+        self.profile = profile  # None: the active scoring profile
+        self.not_found_ttl = not_found_ttl
+        self.not_found_max_entries = not_found_max_entries
+        self._store_lock = threading.Lock()  # The store shares one SQLite connection
+        self._not_found = OrderedDict()      # GTIN-14 -> time.monotonic() when it may be retried
+        self._in_flight = {}                 # GTIN-14 -> _Fetch
+        self._in_flight_lock = threading.Lock()  # Also guards _not_found
+
+    def get_product(self, gtin):
+        """Return (product document or None, result label) for a GTIN-14 (see nutriscan.gtin)"""
+        with self._store_lock:
+            product = self.store.get_product(gtin)
+        if product is not None:
+            return product, 'hit'
+        if self.client is None or self._known_missing(gtin):
+            return None, 'not_found'
+
+        with self._in_flight_lock:
+            fetch = self._in_flight.get(gtin)
+            if fetch is None:
+                fetch = self._in_flight[gtin] = _Fetch()
+            fetch.users += 1
+        try:
+            with fetch.lock:
+                # Another thread may have fetched it while this one waited
+                if fetch.error is not None:
+                    raise fetch.error
+                if fetch.outcome is not None:
+                    return fetch.outcome
+                if self._known_missing(gtin):
+                    return None, 'not_found'
+                with self._store_lock:
+                    product = self.store.get_product(gtin)
+                if product is not None:
+                    return product, 'hit'
+                try:
+                    fetch.outcome = self._read_through(gtin)
+                except Exception as e:
+                    fetch.error = e
+                    raise
+                return fetch.outcome
+        finally:
+            with self._in_flight_lock:
+                fetch.users -= 1
+                if not fetch.users:
+                    del self._in_flight[gtin]
+
+    def _known_missing(self, gtin):
+        with self._in_flight_lock:
+            return self._not_found.get(gtin, 0) > time.monotonic()
+
+    def _remember_missing(self, gtin):
+        now = time.monotonic()
+        with self._in_flight_lock:
+            self._not_found[gtin] = now + self.not_found_ttl
+            self._not_found.move_to_end(gtin)
+            # Entries share one TTL, so the oldest expire first
+            while self._not_found:
+                oldest, retry_at = next(iter(self._not_found.items()))
+                if retry_at > now and len(self._not_found) <= self.not_found_max_entries:
+                    break
+                del self._not_found[oldest]
+
+    def _read_through(self, gtin):
+        data = self.client.get_product(short_code(gtin)).data
+        if not data or data.get('status') != 1:
+            self._remember_missing(gtin)
+            return None, 'not_found'
+
+        product = data['product']
+        score, _, _ = calculate_health_score(normalize_product(product, gtin), self.profile)
+        row = product_row(gtin, product, score)
+        with self._store_lock:
+            self.store.upsert_many([row])
+        return json.loads(row[-1]), 'read_through'  # As stored: projected to PRODUCT_FIELDS
+
+
+# -------------------------------
+# HTTP Server
+# -------------------------------
+def _etag(product):
+    revision = product.get('rev')
+    if revision is not None:
+        return f'"{revision}"'
+    return '"' + hashlib.sha1(json.dumps(product, sort_keys=True).encode('utf-8')).hexdigest() + '"'
+
+
+def make_handler(mirror):
+    class MirrorHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # Keep-alive for the app's pooled connections
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path == '/metrics':
+                self._send(200, metrics.render_prometheus().encode('utf-8'), 'text/plain; version=0.0.4')
+                return
+            match = _PRODUCT_PATH.match(url.path)
+            if not match:
+                self._send_json(404, {'status': 0, 'status_verbose': 'not found'})
+                return
+
+            barcode = match.group(1)
+            try:
+                gtin = normalize_gtin(barcode)
+            except InvalidBarcode:
+                MIRROR_REQUESTS.inc(result='not_found')
+                self._send_json(200, {'code': barcode, 'status': 0, 'status_verbose': 'invalid barcode'})
+                return
+            try:
+                product, result = mirror.get_product(gtin)
+            except Exception as e:
+                MIRROR_REQUESTS.inc(result='error')
+                self._send_json(502, {'status': 0, 'status_verbose': f'upstream error: {e}'})
+                return
+            MIRROR_REQUESTS.inc(result=result)
+            if product is None:
+                self._send_json(200, {'code': barcode, 'status': 0, 'status_verbose': 'product not found'})
+                return
+
+            etag = _etag(product)
+            if self.headers.get('If-None-Match') == etag:
+                self._send(304, b'')
+                return
+            fields = parse_qs(url.query).get('fields')
+            if fields:
+                wanted = set(fields[0].split(','))
+                product = {field: value for field, value in product.items() if field in wanted}
+            body = {'code': barcode, 'status': 1, 'status_verbose': 'product found', 'product': product}
+            self._send_json(200, body, etag)
+
+        def _send_json(self, status, data, etag=None):
+            self._send(status, json.dumps(data).encode('utf-8'), 'application/json', etag)
+
+        def _send(self, status, body, content_type=None, etag=None):
+            self.send_response(status)
+            if content_type:
+                self.send_header('Content-Type', content_type)
+            if etag:
+                self.send_header('ETag', etag)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    return MirrorHandler
+
+
+def make_server(mirror, host='127.0.0.1', port=DEFAULT_PORT):
+    """ThreadingHTTPServer serving mirror; call serve_forever() on it (port 0 picks a free port)"""
+    server = ThreadingHTTPServer((host, port), make_handler(mirror))
+    server.daemon_threads = True
+    return server
+
+
+# -------------------------------
+# Command Line Interface
+# -------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a local mirror of the Open Food Facts product API")
+    parser.add_argument('--store', default=DEFAULT_STORE_PATH, help=f"product store (default: {DEFAULT_STORE_PATH})")
+    parser.add_argument('--host', default='127.0.0.1', help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"port to listen on (default: {DEFAULT_PORT})")
+    parser.add_argument('--upstream', default=OFF_PUBLIC_URL, help=f"API to read through to (default: {OFF_PUBLIC_URL})")
+    parser.add_argument('--offline', action='store_true', help="serve the store only, never call upstream")
+    parser.add_argument('--profile', help="scoring profile JSON for read-through products (default: built-in)")
+    args = parser.parse_args(argv)
+
+    store = ProductStore(args.store)
+    # No retries here: the apps retry the mirror with backoff, and retrying in both places
+    # would multiply the upstream calls of one failing scan
+    client = None if args.offline else OpenFoodFactsClient(base_url=args.upstream, retries=0)
+    profile = load_profile(args.profile) if args.profile else None
+    server = make_server(ProductMirror(store, client, profile), args.host, args.port)
+    print(f"Mirroring {len(store)} products from {args.store} on http://{args.host}:{server.server_address[1]}"
+          f"{' (offline)' if args.offline else ''}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        store.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""Open Food Facts product lookup, normalized into the dict shape the app works with"""
+import hashlib
+import json
+
+from nutriscan import metrics
+from nutriscan.bloom import get_default_filter
+from nutriscan.gtin import InvalidBarcode, normalize_gtin, short_code
+
+# -------------------------------
+# Product Normalization
+# -------------------------------
+def normalize_product(product, barcode):
+    """Map a raw Open Food Facts product document onto the product_info dict used by the app"""
+    return {
+        'name': product.get('product_name', 'Unknown'),
+        'brand': product.get('brands', 'Unknown'),
+        'category': product.get('categories', 'Unknown'),
+        'ingredients': product.get('ingredients_text', 'Unknown'),
+        'ingredients_list': product.get('ingredients', []),  # List of ingredients with details
+        'image_url': product.get('image_url', ''),
+        'nutrition_grade': product.get('nutrition_grade_fr', 'Unknown'),
+        'nutriments': product.get('nutriments', {}),
+        'additives': product.get('additives_tags', []),
+        'ingredients_analysis': product.get('ingredients_analysis_tags', []),
+        'source': 'Open Food Facts',
+        'success': True,
+        'barcode': barcode,
+        'revision': product.get('rev')
+    }
+
+
+def product_revision(product_info):
+    """
+    Identify the version of a product's data, for keying derived results
+    Uses the Open Food Facts revision number; entries cached before it was fetched fall
+    back to a digest of their content
+    """
+    revision = product_info.get('revision')
+    if revision is not None:
+        return str(revision)
+    payload = json.dumps(product_info, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha1(payload).hexdigest()
+
+# -------------------------------
+# Product Information Retrieval Function
+# -------------------------------
+def get_product_info_openfoodfacts(barcode, cache=None, client=None):
+    """Get product information from Open Food Facts API (served from cache when possible)"""
+    # Malformed barcodes and typos are rejected here, without a network round trip
+    try:
+        gtin = normalize_gtin(barcode)
+    except InvalidBarcode as e:
+        return {"error": f"Invalid barcode: {e}", "success": False}
+    
+    entry = cache.get_entry(gtin) if cache is not None else None
+    if entry is not None and entry.fresh:
+        metrics.CACHE_LOOKUPS.inc(result='hit')
+        return entry.product_info
+    if cache is not None:
+        metrics.CACHE_LOOKUPS.inc(result='stale' if entry is not None else 'miss')
+    
+    # Barcodes missing from the known-barcodes filter are definitely not in Open Food Facts
+    # (as of its last refresh); products already cached are always revalidated instead
+    known_barcodes = get_default_filter() if entry is None else None
+    if known_barcodes is not None:
+        if gtin not in known_barcodes:
+            metrics.BLOOM_CHECKS.inc(result='absent')
+            return {"error": "Product not found in Open Food Facts", "success": False}
+        metrics.BLOOM_CHECKS.inc(result='maybe')
+    
+    if client is None:
+        # Imported on first use: the app starts without loading the HTTP stack
+        from nutriscan.client import get_default_client
+        client = get_default_client()
+    
+    try:
+        # Stale cache entries are revalidated instead of downloaded again
+        response = client.get_product(
+            short_code(gtin),
+            etag=entry.etag if entry else None,
+            last_modified=entry.last_modified if entry else None
+        )
+        if response.not_modified:
+            metrics.UPSTREAM_REQUESTS.inc(outcome='not_modified')
+            cache.refresh(gtin)
+            return entry.product_info
+        
+        data = response.data
+        
+        if data.get('status') == 1:  # Product found
+            metrics.UPSTREAM_REQUESTS.inc(outcome='found')
+            with metrics.timed('normalize'):
+                product_info = normalize_product(data['product'], gtin)
+        else:
+            metrics.UPSTREAM_REQUESTS.inc(outcome='not_found')
+            if known_barcodes is not None:
+                metrics.BLOOM_FALSE_POSITIVES.inc()
+            product_info = {"error": "Product not found in Open Food Facts", "success": False}
+    except Exception as e:
+        # Transient API errors are not cached so the next scan retries upstream
+        metrics.UPSTREAM_REQUESTS.inc(outcome='error')
+        return {"error": f"API error: {str(e)}", "success": False}
+    
+    if cache is not None:
+        cache.put(gtin, product_info, etag=response.etag, last_modified=response.last_modified)
+    return product_info
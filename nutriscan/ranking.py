@@ -0,0 +1,180 @@
+"""
+Category percentile ranking from a precomputed score index
+
+    python -m nutriscan.ranking --store catalog.sqlite3
+
+Scores every product in the local product store (see nutriscan.dump) with the active
+scoring profile and saves, per category, the cumulative histogram of its scores. Ranking a
+product in a category is then a binary search for the category plus one array lookup.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from array import array
+from collections import namedtuple
+
+import numpy as np
+
+from nutriscan.openfoodfacts import normalize_product
+from nutriscan.rules import SCORING_PROFILE, load_profile
+from nutriscan.scoring import calculate_health_score
+from nutriscan.store import DEFAULT_STORE_PATH, ProductStore
+
+# -------------------------------
+# Index Defaults
+# -------------------------------
+DEFAULT_INDEX_PATH = os.environ.get(
+    "NUTRISCAN_SCORE_INDEX_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "nutriscan", "score_index.npz")
+)
+MAX_SCORE = 100
+# Categories with fewer products are left out; their percentiles would mean little
+MIN_CATEGORY_SIZE = 10
+
+# top_percent: share of the category scoring at least as well, e.g. 4.2 for "top 5%"
+CategoryRank = namedtuple('CategoryRank', ['category', 'rank', 'total', 'top_percent'])
+
+
+def product_categories(categories_text):
+    """Categories of a product, broadest first, as listed by Open Food Facts"""
+    if not categories_text or categories_text == 'Unknown':
+        return []
+    return [category.strip() for category in categories_text.split(',') if category.strip()]
+
+
+# -------------------------------
+# Score Index
+# -------------------------------
+class ScoreIndex:
+    """
+    Per-category cumulative score histograms: cumulative[i, s] is the number of products
+    of category keys[i] scoring s or less. keys are lowercased and sorted for searchsorted
+    """
+
+    def __init__(self, keys, names, cumulative, scoring_version):
+        self.keys = keys
+        self.names = names
+        self.cumulative = cumulative
+        self.scoring_version = scoring_version
+
+    def __len__(self):
+        return len(self.keys)
+
+    def category_rank(self, category, score):
+        """CategoryRank of a score within one category, or None if the category is not indexed"""
+        key = category.lower()
+        i = np.searchsorted(self.keys, key)
+        if i == len(self.keys) or self.keys[i] != key:
+            return None
+        counts = self.cumulative[i]
+        total = int(counts[-1])
+        better = total - int(counts[min(max(int(score), 0), MAX_SCORE)])
+        rank = min(better + 1, total)  # The product itself need not be in the index
+        return CategoryRank(str(self.names[i]), rank, total, 100.0 * rank / total)
+
+    def rank(self, categories_text, score):
+        """Rank a product in its most specific indexed category, or None"""
+        for category in reversed(product_categories(categories_text)):
+            ranking = self.category_rank(category, score)
+            if ranking is not None:
+                return ranking
+        return None
+
+    def save(self, path):
+        """Write the index atomically, so running apps never load a partial file"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(f, keys=self.keys, names=self.names, cumulative=self.cumulative,
+                                scoring_version=np.array(self.scoring_version))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['keys'], data['names'], data['cumulative'], str(data['scoring_version']))
+
+
+def build_index(scored, scoring_version, min_category_size=MIN_CATEGORY_SIZE):
+    """Build a ScoreIndex from (categories_text, score) pairs"""
+    category_ids = {}  # lowercased category -> id
+    names = []         # id -> display name (as first seen)
+    ids = array('i')
+    scores = array('i')
+    for categories_text, score in scored:
+        score = min(max(int(score), 0), MAX_SCORE)
+        for category in product_categories(categories_text):
+            key = category.lower()
+            category_id = category_ids.get(key)
+            if category_id is None:
+                category_id = category_ids[key] = len(names)
+                names.append(category)
+            ids.append(category_id)
+            scores.append(score)
+
+    counts = np.zeros((len(names), MAX_SCORE + 1), dtype=np.int32)
+    np.add.at(counts, (np.frombuffer(ids, dtype=np.int32), np.frombuffer(scores, dtype=np.int32)), 1)
+    keys = np.array(list(category_ids), dtype=str)
+    keep = np.flatnonzero(counts.sum(axis=1) >= min_category_size)
+    order = keep[np.argsort(keys[keep])]
+    return ScoreIndex(
+        keys[order],
+        np.array(names, dtype=str)[order],
+        np.cumsum(counts[order], axis=1, dtype=np.int32),
+        scoring_version
+    )
+
+
+def score_store(store, profile=None, skipped=None):
+    """
+    Yield (categories_text, score) for every product in the store, scored with profile
+    Documents that cannot be scored (e.g. a non-numeric nutrient) are left out; their
+    barcodes are appended to skipped if given
+    """
+    for barcode, document in store.iter_rows(['barcode', 'product']):
+        try:
+            product_info = normalize_product(json.loads(document), barcode)
+            score, _, _ = calculate_health_score(product_info, profile)
+            categories_text = product_info['category']
+            if categories_text is not None and not isinstance(categories_text, str):
+                raise TypeError(f"categories is a {type(categories_text).__name__}")
+        except (KeyError, TypeError, ValueError, AttributeError):
+            if skipped is not None:
+                skipped.append(barcode)
+            continue
+        yield categories_text, score
+
+
+def load_score_index(path=DEFAULT_INDEX_PATH):
+    """The saved index, or None if it has not been built"""
+    return ScoreIndex.load(path) if os.path.exists(path) else None
+
+
+# -------------------------------
+# Command Line Interface
+# -------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the category score index from the product store")
+    parser.add_argument('--store', default=DEFAULT_STORE_PATH, help=f"product store (default: {DEFAULT_STORE_PATH})")
+    parser.add_argument('-o', '--output', default=DEFAULT_INDEX_PATH, help=f"default: {DEFAULT_INDEX_PATH}")
+    parser.add_argument('--profile', help="scoring profile JSON (default: the active profile)")
+    parser.add_argument('--min-category-size', type=int, default=MIN_CATEGORY_SIZE,
+                        help=f"smallest category to index (default: {MIN_CATEGORY_SIZE})")
+    args = parser.parse_args(argv)
+
+    profile = load_profile(args.profile) if args.profile else SCORING_PROFILE
+    store = ProductStore(args.store)
+    started = time.perf_counter()
+    skipped = []
+    index = build_index(score_store(store, profile, skipped), profile.version, args.min_category_size)
+    index.save(args.output)
+    print(f"Indexed {len(store) - len(skipped)} products ({len(skipped)} skipped) in {len(index)} categories "
+          f"in {time.perf_counter() - started:.1f}s -> {args.output}", file=sys.stderr)
+    store.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
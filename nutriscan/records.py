@@ -0,0 +1,101 @@
+"""
+Compact product records
+
+Inside the app a product is a Product record: a slotted tuple with the nutrients the app
+reads packed into one fixed-order float array. product_info dicts remain the format at the
+API boundary (lookups, the cache's JSON payload); convert with Product.from_product_info.
+"""
+from array import array
+from collections import namedtuple
+
+# (column, nutriments key) pairs for the per-100g values the app reads, in record order
+NUTRIENT_COLUMNS = [
+    ('energy', 'energy_100g'),
+    ('sugars', 'sugars_100g'),
+    ('fat', 'fat_100g'),
+    ('saturated_fat', 'saturated-fat_100g'),
+    ('salt', 'salt_100g'),
+    ('fiber', 'fiber_100g'),
+    ('proteins', 'proteins_100g'),
+    ('carbohydrates', 'carbohydrates_100g'),
+]
+NUTRIENT_KEYS = tuple(key for _, key in NUTRIENT_COLUMNS)
+NUTRIENT_INDEX = {key: i for i, key in enumerate(NUTRIENT_KEYS)}
+
+
+def _to_float(value):
+    # Missing or unparseable nutrients read as 0, like nutriments.get(key, 0) did
+    if value.__class__ is float:
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _ingredient_texts(ingredients_list):
+    # Structured ingredients are dicts with a 'text' key; only the text is used
+    texts = []
+    for ingredient in ingredients_list or ():
+        if isinstance(ingredient, dict) and 'text' in ingredient:
+            texts.append(ingredient['text'])
+        elif isinstance(ingredient, str):
+            texts.append(ingredient)
+    return tuple(texts)
+
+
+class Product(namedtuple('Product', [
+    'barcode', 'name', 'brand', 'category', 'ingredients', 'ingredients_list', 'image_url',
+    'nutrition_grade', 'nutrients', 'additives', 'source', 'revision'
+])):
+    """
+    One product as the app uses it
+    nutrients is an array('d') in NUTRIENT_KEYS order; ingredients_list holds the structured
+    ingredient texts and additives the additive tags, both as tuples
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_product_info(cls, product_info):
+        """Build a record from a successful lookup's product_info dict"""
+        nutriments = product_info.get('nutriments') or {}
+        return cls(
+            product_info.get('barcode', 'Unknown'),
+            product_info.get('name', 'Unknown'),
+            product_info.get('brand', 'Unknown'),
+            product_info.get('category', 'Unknown'),
+            product_info.get('ingredients', 'Unknown'),
+            _ingredient_texts(product_info.get('ingredients_list')),
+            product_info.get('image_url', ''),
+            product_info.get('nutrition_grade', 'Unknown'),
+            array('d', [_to_float(nutriments.get(key, 0.0)) for key in NUTRIENT_KEYS]),
+            tuple(product_info.get('additives') or ()),
+            product_info.get('source', 'Open Food Facts'),
+            product_info.get('revision'),
+        )
+
+    def nutrient(self, key):
+        """Per-100g value of a nutriments key (one of NUTRIENT_KEYS)"""
+        return self.nutrients[NUTRIENT_INDEX[key]]
+
+    def to_product_info(self):
+        """Back to the product_info dict shape (nutriments limited to NUTRIENT_KEYS)"""
+        return {
+            'name': self.name,
+            'brand': self.brand,
+            'category': self.category,
+            'ingredients': self.ingredients,
+            'ingredients_list': list(self.ingredients_list),
+            'image_url': self.image_url,
+            'nutrition_grade': self.nutrition_grade,
+            'nutriments': dict(zip(NUTRIENT_KEYS, self.nutrients)),
+            'additives': list(self.additives),
+            'source': self.source,
+            'success': True,
+            'barcode': self.barcode,
+            'revision': self.revision
+        }
+
+
+# components holds each component's points in ScoringProfile.components order
+ScoreResult = namedtuple('ScoreResult', ['score', 'explanations', 'components'])
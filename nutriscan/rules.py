@@ -0,0 +1,219 @@
+"""
+Declarative health score profile
+
+Every threshold, weight and explanation text used by the health score lives in one table.
+The table is compiled once at import into a ScoringProfile, which is shared by the scalar
+scorer (calculate_health_score), the vectorized scorer, batch jobs and the dashboard.
+
+A different profile can be tried without code edits: point NUTRISCAN_SCORING_PROFILE at a
+JSON file with the same structure as DEFAULT_PROFILE.
+"""
+import json
+import os
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+
+from nutriscan.keywords import KeywordMatcher
+from nutriscan.records import NUTRIENT_INDEX
+
+# Rule input that counts additive tags instead of reading a nutriments key
+ADDITIVES_COUNT = 'additives_count'
+
+# -------------------------------
+# Default Scoring Table
+# -------------------------------
+# Nutrient rules are listed in component order (total max_points = 100).
+# direction "lower": band i applies while value <= breakpoints[i] (lower is better)
+# direction "higher": band i applies once value >= breakpoints[i - 1] (higher is better)
+# fractions / messages have one entry per band; a band's points are max_points * fraction.
+# Nutrients are only scored when present (> 0); rules with "always" are scored regardless.
+DEFAULT_PROFILE = {
+    'version': 'default-1',
+    'nutrients': [
+        # Energy density (WHO guidelines); values above 1000 are taken to be kJ
+        {'component': 'energy', 'nutrient': 'energy_100g', 'column': 'energy', 'max_points': 15,
+         'direction': 'lower', 'kj_to_kcal_above': 1000,
+         'breakpoints': [150, 250, 400], 'fractions': [1.0, 0.7, 0.4, 0.1],
+         'messages': ["Excellent: Low energy density (<150 kcal/100g)",
+                      "Good: Moderate energy density (150-250 kcal/100g)",
+                      "Fair: High energy density (250-400 kcal/100g)",
+                      "Poor: Very high energy density (>400 kcal/100g)"]},
+        # Sugar content (WHO recommends <10% of total energy from sugars)
+        {'component': 'sugar', 'nutrient': 'sugars_100g', 'column': 'sugars', 'max_points': 15,
+         'direction': 'lower', 'breakpoints': [5, 10, 15], 'fractions': [1.0, 0.7, 0.4, 0.1],
+         'messages': ["Excellent: Low sugar content (<5g/100g)",
+                      "Good: Moderate sugar content (5-10g/100g)",
+                      "Fair: High sugar content (10-15g/100g)",
+                      "Poor: Very high sugar content (>15g/100g)"]},
+        # Total fat content
+        {'component': 'fat', 'nutrient': 'fat_100g', 'column': 'fat', 'max_points': 15,
+         'direction': 'lower', 'breakpoints': [3, 10, 20], 'fractions': [1.0, 0.7, 0.4, 0.1],
+         'messages': ["Excellent: Low fat content (<3g/100g)",
+                      "Good: Moderate fat content (3-10g/100g)",
+                      "Fair: High fat content (10-20g/100g)",
+                      "Poor: Very high fat content (>20g/100g)"]},
+        # Saturated fat content (WHO recommends <10% of total energy)
+        {'component': 'saturated_fat', 'nutrient': 'saturated-fat_100g', 'column': 'saturated_fat',
+         'max_points': 10, 'direction': 'lower', 'breakpoints': [1.5, 5, 10],
+         'fractions': [1.0, 0.7, 0.4, 0.1],
+         'messages': ["Excellent: Low saturated fat (<1.5g/100g)",
+                      "Good: Moderate saturated fat (1.5-5g/100g)",
+                      "Fair: High saturated fat (5-10g/100g)",
+                      "Poor: Very high saturated fat (>10g/100g)"]},
+        # Salt content (WHO recommends <5g/day)
+        {'component': 'salt', 'nutrient': 'salt_100g', 'column': 'salt', 'max_points': 10,
+         'direction': 'lower', 'breakpoints': [0.3, 1.5, 3], 'fractions': [1.0, 0.7, 0.4, 0.1],
+         'messages': ["Excellent: Low salt content (<0.3g/100g)",
+                      "Good: Moderate salt content (0.3-1.5g/100g)",
+                      "Fair: High salt content (1.5-3g/100g)",
+                      "Poor: Very high salt content (>3g/100g)"]},
+        # Fiber content (WHO recommends >25g/day)
+        {'component': 'fiber', 'nutrient': 'fiber_100g', 'column': 'fiber', 'max_points': 10,
+         'direction': 'higher', 'breakpoints': [1.5, 3, 6], 'fractions': [0.1, 0.4, 0.7, 1.0],
+         'messages': ["Poor: Very low fiber content (<1.5g/100g)",
+                      "Fair: Low fiber content (1.5-3g/100g)",
+                      "Good: Moderate fiber content (3-6g/100g)",
+                      "Excellent: High fiber content (>6g/100g)"]},
+        # Protein content
+        {'component': 'protein', 'nutrient': 'proteins_100g', 'column': 'proteins', 'max_points': 10,
+         'direction': 'higher', 'breakpoints': [2, 5, 10], 'fractions': [0.1, 0.4, 0.7, 1.0],
+         'messages': ["Poor: Very low protein content (<2g/100g)",
+                      "Fair: Low protein content (2-5g/100g)",
+                      "Good: Moderate protein content (5-10g/100g)",
+                      "Excellent: High protein content (>10g/100g)"]},
+        # Additives assessment (scored even when there are none)
+        {'component': 'additives', 'nutrient': ADDITIVES_COUNT, 'column': 'additives_count',
+         'max_points': 10, 'direction': 'lower', 'always': True,
+         'breakpoints': [0, 2, 5], 'fractions': [1.0, 0.7, 0.4, 0.1],
+         'messages': ["Excellent: No additives detected",
+                      "Good: Few additives (1-2)",
+                      "Fair: Moderate additives (3-5)",
+                      "Poor: Many additives (>5)"]},
+    ],
+    # Ingredient quality: +1 per whole food indicator, -1 per processed indicator found in the
+    # lowercased ingredients text; points = max_points * (count + offset) / span, clamped
+    'ingredient_quality': {
+        'component': 'ingredient_quality', 'max_points': 5, 'offset': 3, 'span': 6,
+        'positive': ['whole grain', 'whole wheat', 'organic', 'natural', 'fresh', 'fruit', 'vegetable'],
+        'negative': ['artificial', 'hydrogenated', 'high fructose', 'corn syrup', 'processed', 'modified starch'],
+        'direction': 'higher', 'breakpoints': [-2, 0, 3],
+        'messages': ["Poor: Many highly processed ingredients",
+                     "Fair: Some processed ingredients detected",
+                     "Good: Reasonable ingredient quality",
+                     "Excellent: High-quality ingredients with minimal processing"]},
+    # Ingredients tab colour coding: an ingredient is positive if it contains any positive
+    # keyword, otherwise negative if it contains any negative keyword
+    'ingredient_display': {
+        'positive': ['whole grain', 'whole wheat', 'organic', 'natural', 'fresh', 'fruit', 'vegetable',
+                     'vitamin', 'mineral'],
+        'negative': ['artificial', 'preservative', 'hydrogenated', 'syrup', 'processed', 'additive',
+                     'color', 'flavor']},
+}
+
+# -------------------------------
+# Compiled Form
+# -------------------------------
+NutrientRule = namedtuple('NutrientRule', [
+    'component', 'nutrient', 'column', 'max_points', 'higher_is_better', 'breakpoints',
+    'points', 'messages', 'always', 'kj_to_kcal_above', 'slot'
+])
+QualityRule = namedtuple('QualityRule', [
+    'component', 'max_points', 'offset', 'span', 'positive', 'negative', 'breakpoints', 'messages'
+])
+
+
+class ScoringProfile:
+    """Compiled scoring table: rules as tuples with per-band points precomputed"""
+
+    def __init__(self, profile):
+        self.version = profile['version']
+        self.rules = tuple(self._compile_rule(rule) for rule in profile['nutrients'])
+        quality = profile['ingredient_quality']
+        self._check_bands(quality, len(quality['messages']))
+        self.quality = QualityRule(
+            quality['component'], quality['max_points'], quality['offset'], quality['span'],
+            tuple(quality['positive']), tuple(quality['negative']),
+            tuple(quality['breakpoints']), tuple(quality['messages'])
+        )
+        display = profile.get('ingredient_display', DEFAULT_PROFILE['ingredient_display'])
+        # Classifies a whole ingredient list in one scan (see nutriscan.keywords)
+        self.ingredient_matcher = KeywordMatcher({'positive': display['positive'], 'negative': display['negative']})
+        # Flat per-rule tuples for the scalar scorer's inner loop (see score_product)
+        self.scoring_plan = tuple(
+            (rule.slot, rule.always, rule.kj_to_kcal_above,
+             bisect_right if rule.higher_is_better else bisect_left,
+             rule.breakpoints, rule.points, rule.messages)
+            for rule in self.rules
+        )
+        self.components = [rule.component for rule in self.rules] + [self.quality.component]
+        self.max_points = {rule.component: rule.max_points for rule in self.rules}
+        self.max_points[self.quality.component] = self.quality.max_points
+
+    @staticmethod
+    def _check_bands(rule, bands):
+        if len(rule['breakpoints']) + 1 != bands or list(rule['breakpoints']) != sorted(rule['breakpoints']):
+            raise ValueError(f"Scoring rule {rule['component']!r}: need sorted breakpoints and one entry per band")
+
+    def _compile_rule(self, rule):
+        self._check_bands(rule, len(rule['fractions']))
+        self._check_bands(rule, len(rule['messages']))
+        # Position of the nutrient in Product.nutrients (None for the additives count)
+        if rule['nutrient'] == ADDITIVES_COUNT:
+            slot = None
+        elif rule['nutrient'] in NUTRIENT_INDEX:
+            slot = NUTRIENT_INDEX[rule['nutrient']]
+        else:
+            raise ValueError(f"Scoring rule {rule['component']!r}: unknown nutrient {rule['nutrient']!r}")
+        return NutrientRule(
+            rule['component'], rule['nutrient'], rule['column'], rule['max_points'],
+            rule['direction'] == 'higher', tuple(rule['breakpoints']),
+            tuple(rule['max_points'] * fraction for fraction in rule['fractions']),
+            tuple(rule['messages']), rule.get('always', False), rule.get('kj_to_kcal_above'), slot
+        )
+
+    @staticmethod
+    def band(rule, value):
+        """Band index of a value under a rule (same binning as np.digitize in the vectorized scorer)"""
+        if rule.higher_is_better:
+            return bisect_right(rule.breakpoints, value)
+        return bisect_left(rule.breakpoints, value)
+
+    def quality_count(self, ingredients_text):
+        """Whole food indicators minus processed indicators found in the lowercased text"""
+        # A dozen plain substring checks on one text beat a regex scan in CPython
+        count = 0
+        for indicator in self.quality.positive:
+            if indicator in ingredients_text:
+                count += 1
+        for indicator in self.quality.negative:
+            if indicator in ingredients_text:
+                count -= 1
+        return count
+
+    def classify_ingredients(self, ingredients):
+        """(has positive keyword, has negative keyword) for each ingredient, in one scan"""
+        matcher = self.ingredient_matcher
+        positive, negative = matcher.bits['positive'], matcher.bits['negative']
+        return [(bool(mask & positive), bool(mask & negative)) for mask in matcher.classify(ingredients)]
+
+    def quality_band(self, quality_count):
+        return bisect_right(self.quality.breakpoints, quality_count)
+
+    def quality_points(self, quality_count):
+        quality = self.quality
+        return max(0, min(quality.max_points, quality.max_points * (quality_count + quality.offset) / quality.span))
+
+
+def load_profile(path):
+    """Load and compile a scoring profile from a JSON file"""
+    with open(path, encoding='utf-8') as f:
+        return ScoringProfile(json.load(f))
+
+
+def _active_profile():
+    path = os.environ.get("NUTRISCAN_SCORING_PROFILE")
+    return load_profile(path) if path else ScoringProfile(DEFAULT_PROFILE)
+
+
+# Profile used wherever no explicit profile is passed
+SCORING_PROFILE = _active_profile()
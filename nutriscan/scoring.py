@@ -0,0 +1,67 @@
+"""Health score calculation"""
+from nutriscan.records import NUTRIENT_KEYS, ScoreResult
+from nutriscan.rules import SCORING_PROFILE
+
+# -------------------------------
+# Health Score Calculation Function
+# -------------------------------
+def _score(nutrients, additives_count, ingredients_text, profile):
+    """Score nutrient values given in NUTRIENT_KEYS order; returns a ScoreResult"""
+    components = []
+    explanations = []
+
+    # 1-8. Nutrient and additive bands (same binning as ScoringProfile.band)
+    for slot, always, kj_to_kcal_above, find_band, breakpoints, points, messages in profile.scoring_plan:
+        value = additives_count if slot is None else nutrients[slot]
+        if not always and not value > 0:
+            # Missing nutrients earn no points and no explanation
+            components.append(0)
+            continue
+        if kj_to_kcal_above is not None and value > kj_to_kcal_above:
+            value = value / 4.184  # Convert kJ to kcal
+        band = find_band(breakpoints, value)
+        components.append(points[band])
+        explanations.append(messages[band])
+
+    # 9. Ingredient quality assessment
+    # Check for presence of whole foods and absence of processed ingredients
+    ingredient_quality_score = profile.quality_count(ingredients_text.lower())
+
+    components.append(profile.quality_points(ingredient_quality_score))
+    explanations.append(profile.quality.messages[profile.quality_band(ingredient_quality_score)])
+
+    # Calculate total score, between 0-100
+    total_score = max(0, min(100, sum(components)))
+
+    return ScoreResult(round(total_score), explanations, tuple(components))
+
+
+def score_product(product, profile=None):
+    """
+    Calculate the health score of a Product record
+    Returns a ScoreResult whose components are in profile.components order
+    """
+    return _score(product.nutrients, len(product.additives), product.ingredients or '', profile or SCORING_PROFILE)
+
+
+def calculate_health_score(product_info, profile=None):
+    """
+    Calculate a health score between 0-100 based on nutritional information and ingredients
+    Based on WHO guidelines, FDA recommendations, and nutritional science research
+    Thresholds, weights and explanations come from the scoring profile (see nutriscan.rules)
+    Takes a product_info dict; returns (score, explanations, {component: points})
+    """
+    if not product_info.get('success', False):
+        return 0, "Cannot calculate score: Product information not available", {}
+
+    if profile is None:
+        profile = SCORING_PROFILE
+
+    nutriments = product_info.get('nutriments', {})
+    result = _score(
+        [nutriments.get(key, 0) for key in NUTRIENT_KEYS],
+        len(product_info.get('additives', [])),
+        product_info.get('ingredients', ''),
+        profile
+    )
+    return result.score, result.explanations, dict(zip(profile.components, result.components))
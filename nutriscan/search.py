@@ -0,0 +1,264 @@
+"""
+Product search by name, brand and category
+
+    python -m nutriscan.search --store catalog.sqlite3
+    python -m nutriscan.search --query "ferero nutel"
+
+Builds, from the local product store (see nutriscan.dump), an SQLite FTS5 full-text index
+(an inverted index: term -> products) over product names, brands and categories. Queries
+are answered locally, best match first by BM25. The last word (of 2 letters or more) is
+matched as a prefix, since it is usually still being typed, and words the index has never
+seen are replaced with the indexed words one typo away (a letter added, dropped, changed
+or two letters swapped).
+"""
+import argparse
+import heapq
+import json
+import math
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import unicodedata
+from collections import namedtuple
+
+# -------------------------------
+# Search Defaults
+# -------------------------------
+DEFAULT_SEARCH_PATH = os.environ.get(
+    "NUTRISCAN_SEARCH_INDEX_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "nutriscan", "search.sqlite3")
+)
+DEFAULT_LIMIT = 10
+# Matches ranked per query. Rows are stored shortest text first, the order BM25 favours for
+# a word, so the first matches found are the likely best ones and very common words
+# (thousands of matches) still rank in milliseconds
+MAX_CANDIDATES = 1000
+# BM25 parameters, as in SQLite's bm25()
+K1 = 1.2
+B = 0.75
+# BM25 weights of the name, brand and categories columns: a name match counts most
+COLUMN_WEIGHTS = (10.0, 5.0, 1.0)
+# Words shorter than this are not corrected; nearly every edit of them is another word
+MIN_TYPO_LENGTH = 4
+MAX_CORRECTIONS = 3
+_ALPHABET = 'abcdefghijklmnopqrstuvwxyz0123456789'
+
+SearchResult = namedtuple('SearchResult', ['barcode', 'name', 'brand', 'score'])
+
+
+_WORD = re.compile(r'[^\W_]+')
+
+
+def query_terms(text):
+    """Words of a text as the index tokenizes them: lowercased, without diacritics"""
+    text = text.lower()
+    if not text.isascii():
+        text = ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+    return _WORD.findall(text)
+
+
+def _edits(term):
+    """Every string one typo away from term"""
+    splits = [(term[:i], term[i:]) for i in range(len(term) + 1)]
+    edits = set()
+    for left, right in splits:
+        if right:
+            edits.add(left + right[1:])
+            for c in _ALPHABET:
+                edits.add(left + c + right[1:])
+        if len(right) > 1:
+            edits.add(left + right[1] + right[0] + right[2:])
+        for c in _ALPHABET:
+            edits.add(left + c + right)
+    edits.discard(term)
+    return edits
+
+
+def _prefix_end(prefix):
+    # Upper bound of the terms starting with prefix, for a range scan of the terms table
+    return prefix + '\U0010ffff'
+
+
+# -------------------------------
+# Search Index
+# -------------------------------
+class ProductSearch:
+    """
+    Read-only connection to a search index built by build_search_index
+    Safe to share between threads (one connection behind a lock, like HistoryStore)
+    """
+
+    def __init__(self, path=DEFAULT_SEARCH_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        # Index-wide BM25 statistics: products and their average number of words
+        self.products, self.average_length = self._conn.execute(
+            "SELECT products, average_length FROM stats"
+        ).fetchone()
+
+    def __len__(self):
+        return self.products
+
+    def _known(self, terms, prefix):
+        """(documents, term) for the given terms the index has, most frequent first"""
+        # One statement for all candidates; with prefix, a term counts if any indexed word
+        # starts with it (documents of the first such word, in index order)
+        if prefix:
+            sql = ("SELECT (SELECT documents FROM terms WHERE term >= value AND term < value || ? LIMIT 1) AS n, "
+                   "value FROM json_each(?) WHERE n IS NOT NULL ORDER BY n DESC")
+            params = (_prefix_end(''), json.dumps(terms))
+        else:
+            sql = ("SELECT documents, term FROM terms WHERE term IN (SELECT value FROM json_each(?)) "
+                   "ORDER BY documents DESC")
+            params = (json.dumps(terms),)
+        return self._conn.execute(sql, params).fetchall()
+
+    def _words(self, term, prefix):
+        """Indexed words a query word stands for: itself, or its most frequent corrections"""
+        if len(term) < MIN_TYPO_LENGTH or self._known([term], prefix):
+            return (term,)
+        return tuple(edit for _, edit in self._known(sorted(_edits(term)), prefix)[:MAX_CORRECTIONS]) or (term,)
+
+    def _idf(self, words, prefix):
+        """BM25 inverse document frequency of a query word, from the indexed words' counts"""
+        documents = 0
+        for word in words:
+            if prefix:
+                row = self._conn.execute("SELECT sum(documents) FROM terms WHERE term >= ? AND term < ?",
+                                         (word, _prefix_end(word))).fetchone()
+            else:
+                row = self._conn.execute("SELECT documents FROM terms WHERE term = ?", (word,)).fetchone()
+            documents += (row and row[0]) or 0
+        documents = min(documents, self.products)
+        # Same formula as SQLite's bm25(), floored so very common words still count a little
+        return max(math.log((self.products - documents + 0.5) / (documents + 0.5)), 1e-6)
+
+    def _bm25(self, texts, groups):
+        """BM25 of one product's name, brand and categories texts, weighted by COLUMN_WEIGHTS"""
+        columns = [query_terms(text) if text else [] for text in texts]
+        norm = K1 * (1 - B + B * sum(map(len, columns)) / self.average_length)
+        score = 0.0
+        for words, prefix, idf in groups:
+            frequency = 0.0
+            for weight, tokens in zip(COLUMN_WEIGHTS, columns):
+                if prefix:
+                    frequency += weight * sum(token.startswith(words) for token in tokens)
+                else:
+                    frequency += weight * sum(token in words for token in tokens)
+            score += idf * frequency * (K1 + 1) / (frequency + norm)
+        return score
+
+    def search(self, text, limit=DEFAULT_LIMIT):
+        """Best matching products for a free-text query, as SearchResults"""
+        terms = query_terms(text)
+        if not terms:
+            return []
+        with self._lock:
+            groups = []  # (indexed words, match as prefix, idf) per query word
+            for i, term in enumerate(terms):
+                # A last word that alone fills MAX_CANDIDATES is matched exactly: expanding it
+                # would make SQLite merge the product lists of every longer word first
+                prefix = i == len(terms) - 1 and len(term) > 1 and \
+                    not any(documents >= MAX_CANDIDATES for documents, _ in self._known([term], False))
+                words = self._words(term, prefix)
+                groups.append((words, prefix, self._idf(words, prefix)))
+            match = ' AND '.join(
+                '(' + ' OR '.join(f'"{word}"' + ('*' if prefix else '') for word in words) + ')'
+                for words, prefix, _ in groups
+            )
+            candidates = self._conn.execute(
+                "SELECT barcode, name, brand, score, categories FROM search WHERE search MATCH ? LIMIT ?",
+                (match, MAX_CANDIDATES)
+            ).fetchall()
+        # Ranked here rather than with SQLite's bm25(), which counts every product containing
+        # each word on every query; ties keep the stored (shortest first) order
+        best = heapq.nlargest(limit, candidates, key=lambda row: self._bm25((row[1], row[2], row[4]), groups))
+        return [SearchResult(*row[:4]) for row in best]
+
+    def close(self):
+        self._conn.close()
+
+
+def build_search_index(path, rows):
+    """
+    Build a search index from (barcode, name, brand, categories, score) rows
+    The index is written next to path and swapped in, so running apps never see a partial file
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    # Prefix indexes make 2 and 3 letter prefixes (the first keystrokes) cheap to expand
+    conn.execute("""
+        CREATE VIRTUAL TABLE search USING fts5(
+            name, brand, categories, barcode UNINDEXED, score UNINDEXED,
+            tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+        )
+    """)
+    # Staged first so rows can be stored shortest text first (see MAX_CANDIDATES)
+    conn.execute("CREATE TEMP TABLE staging (barcode, name, brand, categories, score)")
+    with conn:
+        conn.executemany("INSERT INTO staging VALUES (?, ?, ?, ?, ?)", rows)
+        conn.execute("""
+            INSERT INTO search (barcode, name, brand, categories, score)
+            SELECT barcode, name, brand, categories, score FROM staging
+            ORDER BY length(coalesce(name, '')) + length(coalesce(brand, '')) + length(coalesce(categories, ''))
+        """)
+        conn.execute("DROP TABLE staging")
+    with conn:
+        conn.execute("INSERT INTO search (search) VALUES ('optimize')")
+        # Every indexed word with its document count, for typo correction
+        conn.execute("CREATE VIRTUAL TABLE temp.vocabulary USING fts5vocab(main, search, row)")
+        conn.execute("CREATE TABLE terms (term TEXT PRIMARY KEY, documents INTEGER) WITHOUT ROWID")
+        conn.execute("INSERT INTO terms SELECT term, doc FROM temp.vocabulary")
+        (count,) = conn.execute("SELECT COUNT(*) FROM search").fetchone()
+        (words,) = conn.execute("SELECT coalesce(sum(cnt), 0) FROM temp.vocabulary").fetchone()
+        conn.execute("CREATE TABLE stats (products INTEGER, average_length REAL)")
+        conn.execute("INSERT INTO stats VALUES (?, ?)", (count, words / count if count else 1.0))
+    conn.close()
+    os.replace(tmp_path, path)
+    return count
+
+
+def iter_store_rows(store):
+    """Yield build_search_index input for every product in the store"""
+    return store.iter_rows(['barcode', 'name', 'brand', 'category', 'score'])
+
+
+# -------------------------------
+# Command Line Interface
+# -------------------------------
+def main(argv=None):
+    from nutriscan.store import DEFAULT_STORE_PATH, ProductStore
+
+    parser = argparse.ArgumentParser(description="Build or query the product search index")
+    parser.add_argument('--store', default=DEFAULT_STORE_PATH, help=f"product store (default: {DEFAULT_STORE_PATH})")
+    parser.add_argument('-o', '--output', default=DEFAULT_SEARCH_PATH, help=f"default: {DEFAULT_SEARCH_PATH}")
+    parser.add_argument('-q', '--query', help="search the index instead of building it")
+    parser.add_argument('--limit', type=int, default=DEFAULT_LIMIT, help=f"results (default: {DEFAULT_LIMIT})")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    if args.query is not None:
+        search = ProductSearch(args.output)
+        results = search.search(args.query, args.limit)
+        for result in results:
+            print(f"{result.barcode}\t{result.score}\t{result.name}\t{result.brand}")
+        print(f"{len(results)} results in {(time.perf_counter() - started) * 1000:.1f} ms", file=sys.stderr)
+        search.close()
+        return 0
+
+    store = ProductStore(args.store)
+    count = build_search_index(args.output, iter_store_rows(store))
+    print(f"Indexed {count} products in {time.perf_counter() - started:.1f}s -> {args.output}", file=sys.stderr)
+    store.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""Local SQLite product store populated from the Open Food Facts bulk dump"""
+import json
+import os
+import sqlite3
+
+from nutriscan.client import PRODUCT_FIELDS
+from nutriscan.records import NUTRIENT_COLUMNS
+
+DEFAULT_STORE_PATH = os.environ.get(
+    "NUTRISCAN_STORE_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "nutriscan", "catalog.sqlite3")
+)
+
+SUMMARY_COLUMNS = ['barcode', 'name', 'brand', 'category', 'score'] + \
+    [column for column, _ in NUTRIENT_COLUMNS] + ['additives_count']
+ALL_COLUMNS = SUMMARY_COLUMNS + ['product']
+
+
+def project_product(product):
+    """Keep only the product fields the app reads (same projection as API lookups)"""
+    return {field: product[field] for field in PRODUCT_FIELDS if field in product}
+
+
+def product_row(barcode, product, score):
+    """Build a store row (ALL_COLUMNS order) from a raw product document and its health score"""
+    nutriments = product.get('nutriments') or {}
+    return (
+        barcode,
+        product.get('product_name'),
+        product.get('brands'),
+        product.get('categories'),
+        score,
+        *[nutriments.get(key) for _, key in NUTRIENT_COLUMNS],
+        len(product.get('additives_tags') or []),
+        json.dumps(project_product(product)),
+    )
+
+
+class ProductStore:
+    """
+    One row per product: summary and nutrient columns for bulk jobs, plus the projected
+    raw product document so lookups can be answered exactly like the API would
+    Rows are keyed on the product's GTIN-14 (see nutriscan.gtin)
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        nutrient_defs = ''.join(f"{column} REAL, " for column, _ in NUTRIENT_COLUMNS)
+        self._conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS products (
+                barcode TEXT PRIMARY KEY,
+                name TEXT,
+                brand TEXT,
+                category TEXT,
+                score INTEGER,
+                {nutrient_defs}
+                additives_count INTEGER,
+                product TEXT NOT NULL
+            )
+        """)
+
+    def upsert_many(self, rows):
+        """Insert or replace rows built by product_row() in a single transaction"""
+        placeholders = ', '.join('?' * len(ALL_COLUMNS))
+        with self._conn:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO products ({', '.join(ALL_COLUMNS)}) VALUES ({placeholders})",
+                rows
+            )
+
+    def get_product(self, barcode):
+        """Return the stored raw product document for a barcode, or None"""
+        row = self._conn.execute("SELECT product FROM products WHERE barcode = ?", (barcode,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def iter_rows(self, columns=SUMMARY_COLUMNS, batch_size=10000):
+        """Stream rows of the given columns without loading the whole table"""
+        cursor = self._conn.execute(f"SELECT {', '.join(columns)} FROM products")
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+
+    def close(self):
+        self._conn.close()